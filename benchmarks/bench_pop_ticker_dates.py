@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+Regression benchmark for FinDataExtract.pop_ticker_dates
+
+Times the vectorized day boundary detection against the original row by row
+loop on synthetic 1m bars and reports rows/sec for both. Run from the
+repository root:
+
+    python benchmarks/bench_pop_ticker_dates.py --tickers 20 --days 60
+
+@author: Leo
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+from findata_extraction import FinDataExtract
+from synthetic import synthetic_minutes
+
+
+def legacy_ticker_dates(new_data):
+    """The original per-row loop, kept here as the benchmark baseline"""
+
+    begin_index = new_data.index[0]
+    end_index = new_data.index[-1]
+    dates = []
+    month = new_data["Datetime"][begin_index].month
+    day = new_data["Datetime"][begin_index].day
+    year = new_data["Datetime"][begin_index].year
+    start = begin_index
+    num_days = 0
+    dates.append([month, day, year, start])
+
+    for i in range(begin_index+1, end_index):
+        if new_data["Datetime"][i].date() != new_data["Datetime"][i-1].date():
+            start = i
+            month = new_data["Datetime"][i].month
+            day = new_data["Datetime"][i].day
+            year = new_data["Datetime"][i].year
+            dates.append([month, day, year, start])
+            dates[num_days].append(i)
+            num_days += 1
+
+    dates[-1].append(end_index+1)
+
+    return dates
+
+
+def run(tickers=20, days=60):
+    data = {f"T{n:04d}": synthetic_minutes(days, seed=n) for n in range(tickers)}
+    rows = sum(len(frame) for frame in data.values())
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # pop_ticker_dates finds tickers from the file names in file_path
+        for ticker in data:
+            open(path.join(tmp_dir, f"{ticker}-1m.csv"), "w").close()
+
+        fde = FinDataExtract(data=data)
+        fde.set_file_path(tmp_dir)
+        start = time.perf_counter()
+        fde.pop_ticker_dates()
+        after = time.perf_counter() - start
+
+    start = time.perf_counter()
+    legacy = {ticker: legacy_ticker_dates(frame) for ticker, frame in data.items()}
+    before = time.perf_counter() - start
+
+    for ticker in data:
+        assert list(fde.ticker_dates[ticker]) == legacy[ticker], ticker
+
+    print(f"\n{tickers} tickers x {days} days = {rows} rows")
+    print(f"Before: {rows / before:,.0f} rows/sec ({before:.2f}s)")
+    print(f"After:  {rows / after:,.0f} rows/sec ({after:.2f}s)")
+    print(f"Speed up: {before / after:.0f}x")
+
+    return before, after
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--days", type=int, default=60)
+    args = parser.parse_args()
+    run(args.tickers, args.days)
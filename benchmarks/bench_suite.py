@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for ingest, date indexing, verification and pack correlation
+
+Writes a synthetic universe of "TICK-1m.csv" files for each scale (kept in
+--data-dir so later runs reuse them) and runs each scale in a fresh process
+so that its peak RSS is its own. Results are saved as JSON for comparing
+runs. Run from the repository root:
+
+    python benchmarks/bench_suite.py --scales 50x20 500x20 --output before.json
+
+@author: Leo
+"""
+
+import argparse
+import contextlib
+import datetime as dt
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from os import path
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak RSS is then not reported
+    resource = None
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+from synthetic import write_universe
+
+# (tickers, days) run by --full
+FULL_SCALES = [(50, 20), (500, 20), (3000, 20), (50, 250), (500, 250), (3000, 250)]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def universe_path(data_dir, tickers, days, seed):
+    return path.join(data_dir, f"universe-{tickers}x{days}-seed{seed}")
+
+
+def prepare(data_dir, tickers, days, seed):
+    """Writes the universe for a scale unless it is already on disk"""
+
+    root = universe_path(data_dir, tickers, days, seed)
+    done = path.join(root, ".complete")
+    if not path.exists(done):
+        start = time.perf_counter()
+        rows = write_universe(root, tickers, days, seed)
+        with open(done, "w") as file:
+            json.dump({"rows": rows}, file)
+        print(f"{tickers}x{days} universe written in "
+              + f"{time.perf_counter() - start:.1f}s")
+
+    return root
+
+
+def run_scale(root, tickers, days):
+    """Times every stage for one universe, run in its own process"""
+
+    from findata_extraction import FinDataExtract
+    from findata_corr import PackCorrelation
+
+    stages = {}
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    def timed(name, function):
+        start = time.perf_counter()
+        with quiet:
+            function()
+        stages[name] = {"seconds": time.perf_counter() - start,
+                        "peak_rss_mb": peak_rss_mb()}
+
+    fde = FinDataExtract()
+    fde.set_file_path(root)
+
+    timed("ingest", fde.pop_data_dict)
+    timed("index", fde.pop_ticker_dates)
+    timed("verify", fde.scan_quality)
+
+    pack = PackCorrelation(fde.data, fde.ticker_dates)
+    timed("pack_correlation", lambda: pack.find_pack_correlation(plot_av=False))
+
+    rows = sum(len(frame) for frame in fde.data.values())
+    for stage in stages.values():
+        stage["rows_per_sec"] = rows / max(stage["seconds"], 1e-9)
+
+    return {"tickers": tickers, "days": days, "rows": rows, "stages": stages,
+            "peak_rss_mb": peak_rss_mb()}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True,
+                              cwd=path.dirname(path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+
+def run(scales, data_dir, seed=0, output=None):
+    results = []
+
+    for tickers, days in scales:
+        root = prepare(data_dir, tickers, days, seed)
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            result = pool.submit(run_scale, root, tickers, days).result()
+        results.append(result)
+
+        print(f"\n{tickers} tickers x {days} days = {result['rows']:,} rows")
+        for name, stage in result["stages"].items():
+            print(f"{name:>17}: {stage['seconds']:8.2f}s "
+                  + f"{stage['rows_per_sec']:14,.0f} rows/sec")
+        if result["peak_rss_mb"] is not None:
+            print(f"{'peak RSS':>17}: {result['peak_rss_mb']:8.0f} MB")
+
+    report = {"created": dt.datetime.now().isoformat(timespec="seconds"),
+              "commit": git_commit(), "python": platform.python_version(),
+              "platform": platform.platform(), "seed": seed, "results": results}
+
+    if output is not None:
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"\nResults saved to {output}")
+
+    return report
+
+
+def parse_scale(text):
+    tickers, days = text.lower().split("x")
+    return int(tickers), int(days)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--scales", nargs="+", type=parse_scale,
+                        default=[(50, 20), (500, 20)],
+                        help="TICKERSxDAYS scales to run, e.g. 50x20 500x250")
+    parser.add_argument("--full", action="store_true",
+                        help="run every scale up to 3000 tickers x 250 days")
+    parser.add_argument("--data-dir", default=path.join("benchmarks", "data"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="JSON file for the results")
+    args = parser.parse_args()
+
+    run(FULL_SCALES if args.full else args.scales, args.data_dir, args.seed, args.output)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Consistency checks of the pack correlation across data backends
+
+Writes a small synthetic universe with gaps in the bars, loads it as the
+usual dictionary of dataframes, as a memory-mapped Panel and as a LazyData
+under a memory budget far below the universe, and asserts that
+find_pack_correlation gives the same corr_date from each for every align
+and method, that the LazyData reads each file a bounded number of times, and
+that each row of find_all_alpha_correlation equals
+find_pack_correlation(align="minute") with that row's ticker as alpha. Run
+from the repository root:
+
+    python benchmarks/check_backends.py --tickers 15 --days 6 --gap-rate 0.05
+
+@author: Leo
+"""
+
+import argparse
+import sys
+import tempfile
+from os import path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+sys.path.insert(0, path.dirname(path.abspath(__file__)))
+from findata_extraction import FinDataExtract
+from findata_corr import PackCorrelation
+from findata_panel import Panel
+from findata_metrics import Metrics
+from synthetic import write_universe
+
+ALIGNS = ["position", "minute"]
+METHODS = ["pearson", "log_return", "spearman"]
+
+
+def assert_same_corr_date(result, expected, label):
+    """Asserts two corr_date frames hold the same days, tickers and statistics"""
+
+    assert list(result.index) == list(expected.index), f"{label}: days differ"
+    for column in expected.columns:
+        if column == "Day":
+            assert list(result[column]) == list(expected[column]), f"{label}: {column}"
+        elif isinstance(expected[column].dtype, pd.CategoricalDtype):
+            assert list(result[column].astype(object)) \
+                   == list(expected[column].astype(object)), f"{label}: {column}"
+        else:
+            np.testing.assert_allclose(result[column].to_numpy(),
+                                       expected[column].to_numpy(),
+                                       rtol=1e-9, atol=1e-12,
+                                       err_msg=f"{label}: {column}")
+
+
+def load(root):
+    fde = FinDataExtract()
+    fde.set_file_path(root)
+    fde.pop_data_dict()
+    fde.pop_ticker_dates()
+
+    return fde
+
+
+def check_panel(root, fde):
+    """Panel against the dictionary of dataframes for every align and method"""
+
+    panel = Panel.write(path.join(root, "panel"), fde.data)
+    alpha = sorted(fde.data.keys())[0]
+
+    for align in ALIGNS:
+        for method in METHODS:
+            expected = PackCorrelation(fde.data, fde.ticker_dates)
+            expected.define_alpha(alpha)
+            expected.find_pack_correlation(plot_av=False, align=align, method=method)
+
+            result = PackCorrelation(panel, panel.ticker_dates)
+            result.define_alpha(alpha)
+            result.find_pack_correlation(plot_av=False, align=align, method=method)
+
+            assert_same_corr_date(result.corr_date, expected.corr_date,
+                                  f"panel {align} {method}")
+            print(f"panel {align:>8} {method:>10}: ok")
+
+
+def check_lazy(root, fde, max_bytes=600_000):
+    """LazyData under max_bytes against the dictionary of dataframes"""
+
+    alpha = sorted(fde.data.keys())[0]
+
+    for align in ALIGNS:
+        for method in METHODS:
+            expected = PackCorrelation(fde.data, fde.ticker_dates)
+            expected.define_alpha(alpha)
+            expected.find_pack_correlation(plot_av=False, align=align, method=method)
+
+            metrics = Metrics(enabled=True)
+            lazy = FinDataExtract(metrics=metrics)
+            lazy.set_file_path(root)
+            lazy.pop_data_dict(lazy=True, max_bytes=max_bytes)
+            result = PackCorrelation(lazy.data, lazy.ticker_dates)
+            result.define_alpha(alpha)
+            result.find_pack_correlation(plot_av=False, align=align, method=method)
+
+            assert_same_corr_date(result.corr_date, expected.corr_date,
+                                  f"lazy {align} {method}")
+            # ticker_dates and the pack arrays may each need a read per ticker
+            loads = metrics.counters["lazy_loads"]
+            assert loads <= 2 * len(fde.data), f"lazy {align} {method}: {loads} loads"
+            print(f"lazy  {align:>8} {method:>10}: ok ({loads} loads)")
+
+
+def check_all_alpha(fde):
+    """Every row of find_all_alpha_correlation against a single alpha run"""
+
+    for method in METHODS:
+        pack = PackCorrelation(fde.data, fde.ticker_dates)
+        stats = pack.find_all_alpha_correlation(method=method)
+        codes = pack.all_alpha_codes
+        positions = {tuple(day): day_num for day_num, day in enumerate(pack.all_alpha_days)}
+
+        for row, alpha in enumerate(pack.all_alpha_tickers):
+            single = PackCorrelation(fde.data, fde.ticker_dates)
+            single.define_alpha(alpha)
+            single.find_pack_correlation(plot_av=False, align="minute", method=method)
+            found = {tuple(values["Day"]): values
+                     for _, values in single.corr_date.iterrows()}
+
+            for day, day_num in positions.items():
+                label = f"all alpha {method} {alpha} {day}"
+                if day not in found:
+                    assert np.isnan(stats[day_num, row, 0]), label
+                    continue
+
+                expected = found[day]
+                np.testing.assert_allclose(
+                    stats[day_num, row],
+                    expected[pack.all_alpha_columns].to_numpy(dtype="float64"),
+                    rtol=1e-9, atol=1e-12, err_msg=label)
+                names = [pack.all_alpha_tickers[code] if code >= 0 else None
+                         for code in codes[day_num, row]]
+                assert names == list(expected[pack.ticker_columns]), label
+
+        print(f"all alpha {method:>10}: ok")
+
+
+def run(tickers=15, days=6, gap_rate=0.05, seed=0):
+    with tempfile.TemporaryDirectory() as root:
+        write_universe(root, tickers, days, seed, gap_rate=gap_rate)
+        fde = load(root)
+        check_panel(root, fde)
+        check_lazy(root, fde)
+        check_all_alpha(fde)
+
+    return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--tickers", type=int, default=15)
+    parser.add_argument("--days", type=int, default=6)
+    parser.add_argument("--gap-rate", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.tickers, args.days, args.gap_rate, args.seed)
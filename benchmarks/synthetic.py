@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Deterministic synthetic 1m bar universe for the benchmarks
+
+Tickers follow a one factor model, each with its own beta to a shared
+market return, so pack correlations look like real ones. Sessions come from
+the exchange calendar (holidays skipped, early closes shortened) and csv
+files are written in the layout produced by the downloads, "TICK-1m.csv"
+with a Datetime column holding New York time with its UTC offset. A small
+fraction of minutes are dropped and repeated to exercise gap and duplicate
+handling.
+
+@author: Leo
+"""
+
+import sys
+from os import makedirs, path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+from findata_calendar import ExchangeCalendar, MARKET_OPEN
+
+
+def session_stamps(days, start="2022-01-03"):
+    """Returns the naive New York minute stamps of the first days sessions"""
+
+    calendar = ExchangeCalendar()
+    # weekends and holidays need at most 1.5x as many calendar days
+    end = np.datetime64(start, "D") + int(days * 1.5) + 10
+    session_days, minutes = calendar.sessions(start, end)
+    session_days, minutes = session_days[:days], minutes[:days]
+
+    starts = session_days.astype("datetime64[m]") + MARKET_OPEN
+    stamps = [day_start + np.arange(length).astype("timedelta64[m]")
+              for day_start, length in zip(starts, minutes)]
+
+    return np.concatenate(stamps)
+
+
+def market_returns(num_bars, seed=0):
+    """Shared one minute market log returns"""
+
+    rng = np.random.default_rng([seed, 0])
+
+    return rng.standard_normal(num_bars) * 4e-4
+
+
+def synthetic_bars(stamps, market, number, seed=0, gap_rate=0.002, dup_rate=0.001):
+    """
+
+    Returns a dataframe of 1m bars for ticker number, dropping gap_rate and
+    repeating dup_rate of the bars
+    """
+
+    rng = np.random.default_rng([seed, number + 1])
+    num_bars = len(stamps)
+
+    beta = rng.uniform(-0.3, 1.5)
+    returns = beta * market + rng.standard_normal(num_bars) * 6e-4
+    close = rng.uniform(10, 500) * np.exp(np.cumsum(returns))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    spread = np.abs(rng.standard_normal(num_bars)) * close * 2e-4
+    volume = rng.integers(100, 20000, num_bars)
+
+    # occasional stretches without trades
+    for start in rng.choice(num_bars, size=max(1, num_bars // 5000), replace=False):
+        volume[start:start + rng.integers(2, 15)] = 0
+
+    frame = pd.DataFrame({"Datetime": stamps, "Open": open_,
+                          "High": np.maximum(open_, close) + spread,
+                          "Low": np.minimum(open_, close) - spread,
+                          "Close": close, "Adj Close": close, "Volume": volume})
+
+    keep = rng.random(num_bars) >= gap_rate
+    repeat = rng.random(num_bars) < dup_rate
+    rows = np.repeat(np.arange(num_bars), keep * (1 + repeat))
+
+    return frame.iloc[rows].reset_index(drop=True)
+
+
+def synthetic_minutes(days, seed=0):
+    """Returns one ticker of complete bars for the first days sessions"""
+
+    stamps = session_stamps(days)
+
+    return synthetic_bars(stamps, market_returns(len(stamps)), seed,
+                          gap_rate=0, dup_rate=0)
+
+
+def format_stamps(stamps):
+    """Formats naive New York stamps as "2022-01-03 09:30:00-05:00" strings"""
+
+    local = pd.DatetimeIndex(stamps).tz_localize("America/New_York")
+    offsets = (local.tz_localize(None) - local.tz_convert(None)) \
+              .total_seconds().astype("int64") // 60
+    text = np.char.replace(np.datetime_as_string(np.asarray(stamps), unit="s"), "T", " ")
+    suffix = np.where(offsets == -240, "-04:00", "-05:00")
+
+    return np.char.add(text, suffix)
+
+
+def write_universe(root, tickers, days, seed=0, gap_rate=0.002, dup_rate=0.001):
+    """
+
+    Writes tickers csv files of days sessions to root, one ticker at a time,
+    and returns the total number of rows written
+    """
+
+    makedirs(root, exist_ok=True)
+    stamps = session_stamps(days)
+    market = market_returns(len(stamps), seed)
+    rows = 0
+
+    for number in range(tickers):
+        frame = synthetic_bars(stamps, market, number, seed, gap_rate, dup_rate)
+        frame["Datetime"] = format_stamps(frame["Datetime"].values)
+        frame.to_csv(path.join(root, f"T{number:04d}-1m.csv"), index=False)
+        rows += len(frame)
+
+    return rows
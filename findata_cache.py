@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+
+Shared memory cache of a loaded universe so that notebooks and jobs on the
+same machine attach to one read-only copy of the data and ticker_dates by
+name instead of each loading their own.
+
+    python findata_cache.py serve sp500 ./Watchlist/Test
+
+loads the csv files in the folder once and keeps them published as "sp500"
+until stopped. Elsewhere FinDataExtract().attach_cache("sp500") or
+PackCorrelation.from_cache("sp500") attach with no copy of the prices.
+
+@author: Leo
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import tempfile
+import time
+from os import makedirs, path, remove, scandir, getpid
+import numpy as np
+import pandas as pd
+from findata_extraction import TickerDates
+from findata_shm import SharedArrays
+from findata_metrics import enable_logging
+
+logger = logging.getLogger("findata.cache")
+
+
+class StaleCacheError(RuntimeError):
+    """The files a cache was loaded from have changed since it was published"""
+
+
+def registry_path():
+    """Folder holding the manifests of published caches"""
+
+    return path.join(tempfile.gettempdir(), "findata_cache")
+
+
+def file_signatures(file_path):
+    """Returns {file name: [size, modified time ns]} of the data files in file_path"""
+
+    signatures = {}
+    for entry in scandir(file_path):
+        if entry.is_file() and not entry.name.startswith("."):
+            stat = entry.stat()
+            signatures[entry.name] = [stat.st_size, stat.st_mtime_ns]
+        elif entry.is_dir():
+            # store layout, one folder of day files per ticker
+            for day_entry in scandir(entry.path):
+                stat = day_entry.stat()
+                signatures[f"{entry.name}/{day_entry.name}"] = [stat.st_size,
+                                                                stat.st_mtime_ns]
+
+    return signatures
+
+
+class SharedCache:
+    """
+
+    A universe of ticker dataframes and their ticker_dates published in one
+    shared memory block, with a JSON manifest in the registry describing the
+    block and the files it was loaded from.
+
+    Datetime is held as int64 minutes since the epoch ("Minute") and each
+    ticker's ticker_dates as an int64 (days x 5) array ("Dates"). Like a
+    Panel it behaves as the data dictionary, [ticker] returning a dataframe
+    copy, and ticker_arrays gives zero-copy views for PackCorrelation.
+    """
+
+    def __init__(self, name, arrays, manifest, registry=None):
+        self.name = name
+        self.arrays = arrays
+        self.manifest = manifest
+        self.registry = registry_path() if registry is None else registry
+        self.tickers = list(manifest["columns"])
+        self._rows = set(self.tickers)
+
+        self.ticker_dates = {ticker: TickerDates(arrays.ticker_arrays(ticker)["Dates"]
+                                                 .reshape(-1, 5).tolist())
+                             for ticker in self.tickers}
+
+    def __repr__(self):
+        owner = "published" if self.arrays.owner else "attached"
+        return f"SharedCache {self.name} ({owner}) of {len(self.tickers)} tickers"
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __iter__(self):
+        return iter(self.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self._rows
+
+    def keys(self):
+        return list(self.tickers)
+
+    def __getitem__(self, ticker):
+        """Returns a dataframe of a ticker's bars (a copy)"""
+
+        arrays = self.arrays.ticker_arrays(ticker)
+        frame = pd.DataFrame({"Datetime": arrays["Minute"].astype("datetime64[m]")
+                                                          .astype("datetime64[ns]")})
+        for column in self.manifest["columns"][ticker]:
+            frame[column] = np.array(arrays[column])
+
+        return frame
+
+    def ticker_arrays(self, ticker):
+        """Returns zero-copy read-only views of a ticker's arrays keyed by field"""
+
+        return self.arrays.ticker_arrays(ticker)
+
+    def spec(self):
+        """Picklable description for SharedArrays.attach in worker processes"""
+
+        return self.arrays.spec()
+
+    @staticmethod
+    def _manifest_path(name, registry):
+        return path.join(registry, f"{name}.json")
+
+    @classmethod
+    def publish(cls, name, data, ticker_dates, file_path=None, registry=None):
+        """
+
+        Copies data and ticker_dates into shared memory under name, replacing
+        any manifest of that name. When file_path is given the signatures of
+        its files are recorded so attach can tell when the cache is out of
+        date. The block lives until close() or the end of this process.
+        """
+
+        registry = registry_path() if registry is None else registry
+        makedirs(registry, exist_ok=True)
+
+        arrays = {}
+        columns = {}
+        for ticker in data.keys():
+            frame = data[ticker]
+            minutes = pd.to_datetime(frame["Datetime"]).values \
+                      .astype("datetime64[m]").astype("int64")
+            arrays[(ticker, "Minute")] = minutes
+            columns[ticker] = [column for column in frame.columns
+                               if column != "Datetime"]
+            for column in columns[ticker]:
+                arrays[(ticker, column)] = frame[column].to_numpy()
+            arrays[(ticker, "Dates")] = np.array(list(ticker_dates[ticker]),
+                                                 dtype="int64").reshape(-1)
+
+        # short and unique, macOS allows 31 characters
+        block = "fdc_" + hashlib.sha1(f"{name}{getpid()}{time.time()}".encode()) \
+                                .hexdigest()[:16]
+        shared = SharedArrays.create(arrays, name=block)
+
+        manifest = {"name": name, "block": block, "pid": getpid(),
+                    "created": time.time(), "columns": columns,
+                    "layout": [[ticker, field, offset, length, dtype]
+                               for (ticker, field), (offset, length, dtype)
+                               in shared.layout.items()],
+                    "file_path": None if file_path is None else path.abspath(file_path),
+                    "signatures": None if file_path is None
+                                  else file_signatures(file_path)}
+
+        with open(cls._manifest_path(name, registry), "w") as file:
+            json.dump(manifest, file)
+
+        return cls(name, shared, manifest, registry)
+
+    @classmethod
+    def attach(cls, name, registry=None, check=True):
+        """
+
+        Attach to the published cache name. Raises FileNotFoundError if there
+        is no such cache (or its block is gone) and StaleCacheError if check
+        is True and the files it was loaded from have changed.
+        """
+
+        registry = registry_path() if registry is None else registry
+        with open(cls._manifest_path(name, registry)) as file:
+            manifest = json.load(file)
+
+        if check and manifest["signatures"] is not None:
+            if not path.isdir(manifest["file_path"]) \
+               or file_signatures(manifest["file_path"]) != manifest["signatures"]:
+                raise StaleCacheError(f"files in {manifest['file_path']} have "
+                                      + f"changed since {name} was published")
+
+        layout = {(ticker, field): (offset, length, dtype)
+                  for ticker, field, offset, length, dtype in manifest["layout"]}
+        shared = SharedArrays.attach((manifest["block"], layout))
+
+        return cls(name, shared, manifest, registry)
+
+    def is_stale(self):
+        """Whether the files the cache was loaded from have changed"""
+
+        if self.manifest["signatures"] is None:
+            return False
+        if not path.isdir(self.manifest["file_path"]):
+            return True
+
+        return file_signatures(self.manifest["file_path"]) != self.manifest["signatures"]
+
+    def close(self):
+        """
+
+        Detach. The publisher also frees the block and removes the manifest,
+        unless a newer publish of the same name has replaced it
+        """
+
+        self.ticker_dates = {}
+        self.arrays.close()
+
+        if self.arrays.owner:
+            manifest_path = self._manifest_path(self.name, self.registry)
+            try:
+                with open(manifest_path) as file:
+                    current = json.load(file)["block"]
+            except (OSError, ValueError, KeyError):
+                current = None
+            if current == self.manifest["block"]:
+                remove(manifest_path)
+
+        return
+
+
+def serve(name, file_path, interval=60):
+    """
+
+    Load the csv files in file_path, publish them as name and keep them
+    published, republishing whenever the files change, until interrupted
+    """
+
+    from findata_extraction import FinDataExtract
+
+    cache = None
+    try:
+        while True:
+            if cache is None or cache.is_stale():
+                fde = FinDataExtract()
+                fde.set_file_path(file_path)
+                fde.pop_data_dict()
+                fde.pop_ticker_dates()
+                new_cache = fde.publish_cache(name)
+                if cache is not None:
+                    cache.close()
+                cache = new_cache
+                logger.info(f"{name} published with {len(cache)} tickers")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if cache is not None:
+            cache.close()
+
+    return
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish a universe in shared memory")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("name")
+    parser.add_argument("file_path")
+    parser.add_argument("--interval", type=float, default=60,
+                        help="seconds between checks for changed files")
+    args = parser.parse_args()
+    enable_logging()
+    serve(args.name, args.file_path, args.interval)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+
+NYSE regular session calendar built from the exchange's holiday rules, so
+that data checks know which days should have bars and how many.
+
+@author: Leo
+"""
+
+import datetime as dt
+import numpy as np
+
+# regular session of 390 one minute bars from 09:30 to 16:00
+MARKET_OPEN = 9*60 + 30
+DAY_MINUTES = 390
+
+
+def easter(year):
+    """Returns Easter Sunday of year (anonymous Gregorian algorithm)"""
+
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19*a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2*e + 2*i - h - k) % 7
+    m = (a + 11*h + 22*l) // 451
+    month, day = divmod(h + l - 7*m + 114, 31)
+
+    return dt.date(year, month, day + 1)
+
+
+def nth_weekday(year, month, weekday, n):
+    """Returns the nth (1 based, -1 for last) weekday (Monday 0) of a month"""
+
+    if n > 0:
+        first = dt.date(year, month, 1)
+        return first + dt.timedelta(days=(weekday - first.weekday()) % 7 + 7*(n-1))
+
+    last = dt.date(year + month // 12, month % 12 + 1, 1) - dt.timedelta(days=1)
+    return last - dt.timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def observed(day):
+    """Saturday holidays are observed on Friday and Sunday ones on Monday"""
+
+    if day.weekday() == 5:
+        return day - dt.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + dt.timedelta(days=1)
+    return day
+
+
+class ExchangeCalendar:
+    """
+
+    Trading days and session lengths of the NYSE regular session. Full day
+    closures follow the exchange's holiday rules plus the special closures
+    listed below, and the three regular early closes end trading at 13:00.
+    """
+
+    # one off closures (national days of mourning)
+    special_closures = [dt.date(2012, 10, 29), dt.date(2012, 10, 30),
+                        dt.date(2018, 12, 5), dt.date(2025, 1, 9)]
+
+    early_close_minutes = 210
+
+    def __init__(self):
+        self._years = {}
+
+    def __repr__(self):
+        return "NYSE ExchangeCalendar"
+
+    def holidays(self, year):
+        """Returns the set of weekday closures in year"""
+
+        days = {nth_weekday(year, 1, 0, 3),     # Martin Luther King Jr. Day
+                nth_weekday(year, 2, 0, 3),     # Washington's Birthday
+                easter(year) - dt.timedelta(days=2),
+                nth_weekday(year, 5, 0, -1),    # Memorial Day
+                observed(dt.date(year, 7, 4)),
+                nth_weekday(year, 9, 0, 1),     # Labor Day
+                nth_weekday(year, 11, 3, 4),    # Thanksgiving
+                observed(dt.date(year, 12, 25))}
+
+        # a Saturday New Year's Day is not observed on the Friday before
+        new_year = dt.date(year, 1, 1)
+        if new_year.weekday() != 5:
+            days.add(observed(new_year))
+        if year >= 2022:
+            days.add(observed(dt.date(year, 6, 19)))
+
+        days.update(day for day in self.special_closures if day.year == year)
+
+        return {day for day in days if day.weekday() < 5}
+
+    def early_closes(self, year):
+        """Returns the set of 13:00 closes in year"""
+
+        days = {nth_weekday(year, 11, 3, 4) + dt.timedelta(days=1)}
+
+        # July 3rd when Independence Day falls on Tuesday to Friday
+        if dt.date(year, 7, 3).weekday() < 4:
+            days.add(dt.date(year, 7, 3))
+        # Christmas Eve from Monday to Thursday
+        if dt.date(year, 12, 24).weekday() < 4:
+            days.add(dt.date(year, 12, 24))
+
+        return days - self.holidays(year)
+
+    def _year(self, year):
+        """Cached (session days, session minutes) arrays of one year"""
+
+        if year not in self._years:
+            holidays = self.holidays(year)
+            early = self.early_closes(year)
+            days = np.arange(np.datetime64(f"{year}-01-01"),
+                             np.datetime64(f"{year+1}-01-01"))
+            days = np.array([day for day in days.astype(dt.date).tolist()
+                             if day.weekday() < 5 and day not in holidays],
+                            dtype="datetime64[D]")
+            minutes = np.array([self.early_close_minutes if day in early
+                                else DAY_MINUTES
+                                for day in days.astype(dt.date).tolist()])
+            self._years[year] = (days, minutes)
+
+        return self._years[year]
+
+    def sessions(self, start, end):
+        """
+
+        Returns (days, minutes), datetime64[D] trading days from start to end
+        inclusive and the number of one minute bars each session should have
+        """
+
+        start, end = np.datetime64(start, "D"), np.datetime64(end, "D")
+        first_year = int(str(start)[:4])
+        last_year = int(str(end)[:4])
+
+        years = [self._year(year) for year in range(first_year, last_year + 1)]
+        days = np.concatenate([year[0] for year in years])
+        minutes = np.concatenate([year[1] for year in years])
+        keep = (days >= start) & (days <= end)
+
+        return days[keep], minutes[keep]
+
+    def is_session(self, day):
+        """Whether the exchange is open on day"""
+
+        day = np.datetime64(day, "D")
+        days = self._year(int(str(day)[:4]))[0]
+        position = np.searchsorted(days, day)
+
+        return position < len(days) and days[position] == day
@@ -6,13 +6,359 @@ https://github.com/leomcg108/Pack-Correlation/
 @author: Leo
 """
 
+import hashlib
+import logging
+import pickle
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import matplotlib.pyplot as plt
-from statistics import stdev, mean, median, median_high
 from math import isnan
 import seaborn as sns
 import numpy as np
-from findata_extraction import FinDataExtract
+from findata_extraction import LazyData, as_ticker_dates
+from findata_calendar import MARKET_OPEN, DAY_MINUTES
+from findata_panel import Panel
+from findata_shm import SharedArrays
+from findata_cache import SharedCache
+from findata_metrics import Metrics
+
+logger = logging.getLogger("findata.corr")
+
+
+def corr_to_alpha(alpha, matrix):
+    """
+    
+    Pearson correlation of every column of a (minutes x tickers) matrix to the 
+    alpha vector, or to the matching column of an alpha matrix of the same 
+    shape. As with pandas Series.corr only rows where both values are present
+    are used, so columns may be padded with NaN
+    """
+    
+    if alpha.ndim == 1:
+        alpha = alpha[:, None]
+    mask = ~np.isnan(matrix) & ~np.isnan(alpha)
+    counts = mask.sum(axis=0)
+    alpha_vals = np.where(mask, alpha, 0.0)
+    vals = np.where(mask, matrix, 0.0)
+    
+    with np.errstate(invalid="ignore", divide="ignore"):
+        alpha_dev = np.where(mask, alpha_vals - alpha_vals.sum(axis=0) / counts, 0.0)
+        dev = np.where(mask, vals - vals.sum(axis=0) / counts, 0.0)
+        
+        # same order of operations as np.corrcoef
+        cov = (alpha_dev * dev).sum(axis=0) / (counts - 1)
+        alpha_std = np.sqrt((alpha_dev**2).sum(axis=0) / (counts - 1))
+        std = np.sqrt((dev**2).sum(axis=0) / (counts - 1))
+        corrs = np.clip(cov / alpha_std / std, -1, 1)
+    
+    corrs[counts < 2] = np.nan
+    
+    return corrs
+
+
+def spearman_to_alpha(alpha, matrix):
+    """
+    
+    Spearman correlation of every column of a (minutes x tickers) matrix to the
+    alpha vector. Each column and its own copy of alpha are ranked over only
+    the rows where both values are present, as pandas Series.corr does
+    """
+    
+    mask = ~np.isnan(matrix) & ~np.isnan(alpha)[:, None]
+    ranks = pd.DataFrame(np.where(mask, matrix, np.nan)).rank().to_numpy()
+    alpha_ranks = pd.DataFrame(np.where(mask, alpha[:, None], np.nan)).rank().to_numpy()
+    
+    return corr_to_alpha(alpha_ranks, ranks)
+
+
+def corr_matrix(matrix):
+    """
+    
+    Full (tickers x tickers) Pearson correlation matrix of a (minutes x 
+    tickers) matrix that may be padded with NaN. As in corr_to_alpha each pair
+    of columns uses only the rows where both are present, with the pairwise 
+    counts and sums of every pair found at once from masked matrix products.
+    Pairs with fewer than 2 shared rows or a flat column give NaN
+    """
+    
+    mask = ~np.isnan(matrix)
+    ones = mask.astype("float64")
+    
+    # shift each column by its first value to keep the sums well conditioned
+    first = matrix[np.argmax(mask, axis=0), np.arange(matrix.shape[1])]
+    x = np.where(mask, matrix - first, 0.0)
+    
+    # [i, j] sums over the rows column i shares with column j
+    count = ones.T @ ones
+    sum_x = x.T @ ones
+    sum_xx = (x * x).T @ ones
+    sum_xy = x.T @ x
+    
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sum_xy - sum_x * sum_x.T / count
+        var = sum_xx - sum_x**2 / count
+        var[var <= 1e-12 * sum_xx] = np.nan
+        corr = np.clip(cov / np.sqrt(var * var.T), -1, 1)
+    
+    corr[count < 2] = np.nan
+    
+    return corr
+
+
+def pack_stats_rows(corr):
+    """
+    
+    Pack statistics for every row of a correlation matrix, treating each row 
+    as the correlations of the pack to one alpha and ignoring NaN. Returns a
+    (rows x 7) array of Av, Median (high), Stdev, Beta, Epsilon, Sigma and 
+    Omega correlations and a (rows x 4) array of the column numbers of Beta, 
+    Epsilon, Sigma and Omega, -1 where a row has no valid correlations. Ties
+    go to the lowest column number
+    """
+    
+    num_rows = corr.shape[0]
+    rows = np.arange(num_rows)
+    valid = ~np.isnan(corr)
+    counts = valid.sum(axis=1)
+    has_pack = counts > 0
+    
+    stats = np.full((num_rows, 7), np.nan)
+    codes = np.full((num_rows, 4), -1, dtype="int32")
+    
+    with np.errstate(invalid="ignore", divide="ignore"):
+        total = np.where(valid, corr, 0.0).sum(axis=1)
+        av = total / counts
+        dev = np.where(valid, corr - av[:, None], 0.0)
+        stats[:, 0] = av
+        stats[:, 2] = np.sqrt((dev**2).sum(axis=1) / (counts - 1))
+    
+    # NaN sorts last so the high median of each row sits at counts // 2
+    median = np.sort(corr, axis=1)[rows, np.minimum(counts // 2, corr.shape[1] - 1)]
+    stats[:, 1] = median
+    
+    beta = np.argmax(np.where(valid, corr, -np.inf), axis=1)
+    epsilon = np.argmax(corr == median[:, None], axis=1)
+    sigma = np.argmin(np.where(valid & (corr != 0), np.abs(corr), np.inf), axis=1)
+    omega = np.argmin(np.where(valid, corr, np.inf), axis=1)
+    
+    for column, index in enumerate([beta, epsilon, sigma, omega]):
+        stats[:, column + 3] = corr[rows, index]
+        codes[:, column] = index
+    
+    stats[~has_pack] = np.nan
+    codes[~has_pack] = -1
+    
+    return stats, codes
+
+
+def pack_stats(corr, codes=None):
+    """
+    
+    Pack statistics of one day's correlations to alpha, ignoring NaN, in the 
+    same layout as a row of pack_stats_rows: an array of Av, Median (high), 
+    Stdev, Beta, Epsilon, Sigma and Omega correlations and an array of the 
+    codes of the Beta, Epsilon, Sigma and Omega tickers, where codes gives 
+    each position's ticker code (the position itself when None). Ties go to 
+    the lowest position, Sigma ignores correlations of exactly 0 and a day 
+    without valid correlations gives NaN and -1 codes
+    """
+    
+    corr = np.asarray(corr, dtype="float64")
+    positions = np.flatnonzero(~np.isnan(corr))
+    values = corr[positions]
+    num_values = len(values)
+    
+    stats = np.full(7, np.nan)
+    picks = np.full(4, -1, dtype="int64")
+    if num_values == 0:
+        return stats, picks
+    
+    stats[0] = values.mean()
+    if num_values > 1:
+        stats[2] = np.sqrt(((values - stats[0])**2).sum() / (num_values - 1))
+    stats[1] = np.partition(values, num_values // 2)[num_values // 2]
+    
+    picks[0] = np.argmax(values)
+    picks[1] = np.argmax(values == stats[1])
+    picks[3] = np.argmin(values)
+    non_zero = values != 0
+    if non_zero.any():
+        picks[2] = np.argmin(np.where(non_zero, np.abs(values), np.inf))
+    
+    found = picks >= 0
+    stats[3:][found] = values[picks[found]]
+    picks[found] = positions[picks[found]]
+    if codes is not None:
+        picks[found] = np.asarray(codes)[picks[found]]
+    
+    return stats, picks
+
+
+def rolling_corr_to_alpha(alpha, matrix, window=30, step=1, min_periods=2):
+    """
+    
+    Rolling Pearson correlation of every column of a (minutes x tickers) 
+    matrix to alpha, for windows of window rows ending every step rows, from
+    cumulative sums so each window costs O(1) per ticker. NaN pairs are 
+    ignored and windows with fewer than min_periods pairs give NaN, as do 
+    windows where either series is flat. Returns a (windows x tickers) array
+    """
+    
+    mask = ~np.isnan(matrix) & ~np.isnan(alpha)[:, None]
+    
+    # shift each series by its first value to keep the sums well conditioned
+    alpha_first = alpha[np.argmax(~np.isnan(alpha))]
+    first = matrix[np.argmax(~np.isnan(matrix), axis=0), np.arange(matrix.shape[1])]
+    x = np.where(mask, matrix - first, 0.0)
+    y = np.where(mask, (alpha - alpha_first)[:, None], 0.0)
+    
+    ends = np.arange(window, len(alpha) + 1, step)
+    sums = []
+    for values in (mask.astype("float64"), x, y, x * y, x * x, y * y):
+        cumulative = np.zeros((len(alpha) + 1, matrix.shape[1]))
+        np.cumsum(values, axis=0, out=cumulative[1:])
+        sums.append(cumulative[ends] - cumulative[ends - window])
+    count, sum_x, sum_y, sum_xy, sum_xx, sum_yy = sums
+    
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sum_xy - sum_x * sum_y / count
+        var_x = sum_xx - sum_x**2 / count
+        var_y = sum_yy - sum_y**2 / count
+        
+        # a flat window leaves only cancellation error in the variance, which
+        # would otherwise give a correlation of +-1
+        flat = (var_x <= 1e-12 * sum_xx) | (var_y <= 1e-12 * sum_yy)
+        var_x[flat] = np.nan
+        
+        # clip only the rounding overshoot past +-1
+        corrs = np.clip(cov / np.sqrt(var_x * var_y), -1, 1)
+    
+    corrs[count < max(min_periods, 2)] = np.nan
+    
+    return corrs
+
+
+def _pack_worker(source, alpha, ticker_dates, tickers, align, method, dates,
+                 enabled=False):
+    """
+    
+    Process pool entry point calculating the pack for a shard of days. Returns
+    the day results and the to_dict() of the worker's Metrics
+    """
+    
+    if source[0] == "panel":
+        data = Panel(source[1])
+        shared = None
+    else:
+        data = shared = SharedArrays.attach(source[1])
+    
+    pack = PackCorrelation.__new__(PackCorrelation)
+    pack.data = data
+    pack.ticker_dates = ticker_dates
+    pack.alpha = alpha
+    pack._arrays = {}
+    pack._transforms = {}
+    pack.metrics = Metrics(enabled=enabled)
+    
+    try:
+        results = [pack._pack_day(date, tickers, align, method) for date in dates]
+        metrics = pack.metrics.to_dict()
+    finally:
+        del pack, data
+        if shared is not None:
+            shared.close()
+    
+    return results, metrics
+
+
+def histogram_counts(values, edges, groups=None, num_groups=1):
+    """
+    
+    np.histogram(values, edges)[0] for every group of values at once with one
+    bincount. Bins are [edges[i], edges[i+1]) except the last which also 
+    holds edges[-1], and values outside the edges are not counted, exactly as 
+    np.histogram. Returns a (num_groups x bins) array with groups the group 
+    number of each value (all 0 when None)
+    """
+    
+    edges = np.asarray(edges, dtype="float64")
+    values = np.asarray(values, dtype="float64")
+    num_bins = len(edges) - 1
+    
+    bin_ids = np.searchsorted(edges, values, side="right") - 1
+    bin_ids[values == edges[-1]] = num_bins - 1
+    counted = (bin_ids >= 0) & (bin_ids < num_bins)
+    
+    if groups is None:
+        groups = np.zeros(len(values), dtype="int64")
+    flat = groups[counted] * num_bins + bin_ids[counted]
+    
+    return np.bincount(flat, minlength=num_groups * num_bins) \
+             .reshape(num_groups, num_bins)
+
+
+class RaggedDist(Mapping):
+    """
+    
+    The correlation distributions of many days in one flat array. Day i's 
+    correlations are values[offsets[i]:offsets[i+1]] and are returned as a 
+    read-only view by dist[(year, month, day)]. Histogram matrices of all 
+    days are cached by their bin edges.
+    """
+    
+    def __init__(self, dates, values, offsets):
+        self.dates = list(dates)
+        self.values = values
+        self.offsets = offsets
+        self.values.flags.writeable = False
+        self._positions = {date: num for num, date in enumerate(self.dates)}
+        self._histograms = {}
+        
+    @classmethod
+    def from_lists(cls, dates, dists):
+        """Builds a RaggedDist from a list of dates and one sequence per date"""
+        
+        lengths = np.array([len(dist) for dist in dists], dtype="int64")
+        offsets = np.concatenate(([0], np.cumsum(lengths)))
+        values = np.concatenate([np.asarray(dist, dtype="float64") for dist in dists]) \
+                 if len(dists) > 0 else np.empty(0)
+        
+        return cls(dates, values, offsets)
+        
+    def __repr__(self):
+        return f"RaggedDist of {len(self.dates)} days and {len(self.values)} correlations"
+    
+    def __len__(self):
+        return len(self.dates)
+    
+    def __iter__(self):
+        return iter(self.dates)
+    
+    def __contains__(self, date):
+        return date in self._positions
+    
+    def __getitem__(self, date):
+        num = self._positions[date]
+        
+        return self.values[self.offsets[num]:self.offsets[num+1]]
+    
+    def lengths(self):
+        """Number of correlations of each day"""
+        
+        return np.diff(self.offsets)
+    
+    def histograms(self, edges):
+        """(days x bins) counts of every day's correlations, see histogram_counts"""
+        
+        key = tuple(edges)
+        if key not in self._histograms:
+            days = np.repeat(np.arange(len(self.dates)), self.lengths())
+            counts = histogram_counts(self.values, edges, days, len(self.dates))
+            counts.flags.writeable = False
+            self._histograms[key] = counts
+            
+        return self._histograms[key]
 
 
 class PackCorrelation:
@@ -26,11 +372,26 @@ class PackCorrelation:
     In addition also creates the distribution of correlations for each day 
     as a dictionary of lists
     """
+    
+    corr_columns = ["Day", "Av Corr", "Dir Corr", "Median Corr", "Stdev Corr",
+                    "Alpha Gain", "Beta", "Beta Corr", "Epsilon", "Epsilon Corr", 
+                    "Sigma", "Sigma Corr", "Omega", "Omega Corr"]
+    ticker_columns = ["Beta", "Epsilon", "Sigma", "Omega"]
+    all_alpha_columns = ["Av Corr", "Median Corr", "Stdev Corr", "Beta Corr", 
+                         "Epsilon Corr", "Sigma Corr", "Omega Corr"]
       
-    def __init__(self, data, ticker_dates):
+    def __init__(self, data, ticker_dates, metrics=None):
         self.data = data
-        self.ticker_dates = ticker_dates
+        self.ticker_dates = as_ticker_dates(ticker_dates)
         self.alpha = list(data.keys())[0]
+        self.align = "position"
+        self.method = "pearson"
+        self.day_cache = {}
+        self._arrays = {}
+        self._transforms = {}
+        self._lazy_bytes = {}
+        self._lazy_total = 0
+        self.metrics = Metrics() if metrics is None else metrics
 
     def __repr__(self):
         
@@ -40,102 +401,452 @@ class PackCorrelation:
         if alpha in self.data:
             self.alpha = alpha
         else:
-            print(f"{alpha} not in data dictionary")
+            logger.warning(f"{alpha} not in data dictionary")
 
-    def find_pack_correlation(self, start_index=None, end_index=None, plot_av=True):
-        """
+    @classmethod
+    def from_panel(cls, panel_path):
+        """Creates a PackCorrelation that runs directly on a memory-mapped Panel"""
         
-        Calculates pack correlation and the correlation distribution for each 
-        day in the timeframe specified by start_index and end_index
-        """
+        panel = Panel(panel_path)
         
-        index_num = 0
-        self.dist_date = {}
-        alpha_data = self.data[self.alpha]
+        return cls(panel, panel.ticker_dates)
 
-        self.corr_date = pd.DataFrame(columns=["Day", "Av Corr", "Dir Corr",
-                                          "Median Corr", "Stdev Corr",
-                                          "Alpha Gain", "Beta", "Beta Corr", 
-                                          "Epsilon", "Epsilon Corr", "Sigma", 
-                                          "Sigma Corr", "Omega", "Omega Corr"])
+    @classmethod
+    def from_cache(cls, name, registry=None, check=True):
+        """Creates a PackCorrelation on the shared memory cache published as name"""
+        
+        cache = SharedCache.attach(name, registry, check)
+        
+        return cls(cache, cache.ticker_dates)
 
-        for date in self.ticker_dates[self.alpha][start_index:end_index]:
-            corr_list = []
-            ticker_corr = {}
-            day = date[:3]
-            # print(day)
-            
-            alpha_days = [item[:3] for item in self.ticker_dates[self.alpha]]
-            alpha_day = alpha_days.index(day)
-            alpha_open = self.ticker_dates[self.alpha][alpha_day][3]
-            alpha_close = self.ticker_dates[self.alpha][alpha_day][4]-1
-            alpha_slice = alpha_data[alpha_open:alpha_close]
-            alpha_gain = alpha_data["Close"][alpha_close] \
-                          / alpha_data["Open"][alpha_open]
-                          
-            alpha_slice = alpha_slice["Close"].reset_index(drop=True)
-            len_day = len(alpha_slice)
-                  
-            if alpha_gain > 1:
-                direction = 1
+    def _ticker_arrays(self, ticker):
+        """
+        
+        Returns cached float64 arrays of a ticker's Open and Close prices, or 
+        zero-copy views when data is a memory-mapped Panel. The cache is keyed
+        on the identity and length of the ticker's dataframe, so replacing or
+        extending data[ticker] drops its arrays and transforms.
+        
+        When data is a LazyData the arrays are compact copies in the frame's 
+        own dtypes kept outside its least recently used frames, so each ticker
+        is read from disk about once per pass rather than once per day. The
+        frame is only checked while LazyData still holds it, and a warning is
+        logged once the arrays outgrow max_bytes
+        """
+        
+        if hasattr(self.data, "ticker_arrays"):
+            return self.data.ticker_arrays(ticker)
+        
+        lazy = isinstance(self.data, LazyData)
+        cached = self._arrays.get(ticker)
+        if lazy:
+            frame = self.data.resident(ticker)
+            if cached is not None and frame is None:
+                return cached[1]
+            if frame is None:
+                frame = self.data[ticker]
+        else:
+            frame = self.data[ticker]
+        
+        signature = (id(frame), len(frame))
+        if cached is None or cached[0] != signature:
+            self._transforms.pop(ticker, None)
+            if lazy:
+                cached = signature, {"Open": frame["Open"].to_numpy(copy=True),
+                                     "Close": frame["Close"].to_numpy(copy=True)}
+                self._track_lazy_bytes(ticker, cached[1])
             else:
-                direction = -1
-            
-            for ticker in self.data.keys():
-                if ticker != self.alpha:  # avoids self correlation for alpha
+                cached = signature, {"Open": frame["Open"].to_numpy(dtype="float64"),
+                                     "Close": frame["Close"].to_numpy(dtype="float64")}
+            self._arrays[ticker] = cached
+        
+        return cached[1]
     
-                    all_days = [item[:3] for item in self.ticker_dates[ticker]]
-            
-                    if day in all_days:
-                        index_day = all_days.index(day)
-                        index_open = self.ticker_dates[ticker][index_day][3]            
-                        index_close = self.ticker_dates[ticker][index_day][4]-1
-                        day_slice = self.data[ticker][index_open:index_close]
-                        
-                        day_slice = day_slice["Close"].reset_index(drop=True)
-                        
-                        # check that slice is full day of data
-                        if len(day_slice) > len_day - 10:
-                            corr = alpha_slice.corr(day_slice)                    
-                            corr_list.append(corr)
-                            ticker_corr[ticker] = corr
-                        
-            corr_list = [x for x in corr_list if isnan(x)==False]
-    
-            day_corr = mean(corr_list)
-            median_corr = median_high(corr_list)
-            stdev_corr = stdev(corr_list)
-            
-            beta = max(ticker_corr, key=ticker_corr.get)
-            beta_corr = ticker_corr[beta]
+    def _track_lazy_bytes(self, ticker, arrays):
+        """Warns once when the arrays kept for a LazyData exceed its max_bytes"""
+        
+        nbytes = sum(values.nbytes for values in arrays.values())
+        before = self._lazy_total
+        self._lazy_total += nbytes - self._lazy_bytes.get(ticker, 0)
+        self._lazy_bytes[ticker] = nbytes
+        
+        max_bytes = self.data.max_bytes
+        if max_bytes is not None and before <= max_bytes < self._lazy_total:
+            logger.warning(f"Pack arrays of {len(self._lazy_bytes)} tickers use "
+                           + f"{self._lazy_total:,} bytes, above the LazyData "
+                           + f"max_bytes of {max_bytes:,}")
+    
+    def _ticker_minutes(self, ticker):
+        """Returns the cached minute since the epoch of each of a ticker's bars"""
+        
+        arrays = self._ticker_arrays(ticker)
+        if "Minute" not in arrays:
+            arrays["Minute"] = pd.to_datetime(self.data[ticker]["Datetime"]) \
+                               .values.astype("datetime64[m]").astype("int64")
+            if isinstance(self.data, LazyData):
+                self._track_lazy_bytes(ticker, arrays)
+        
+        return arrays["Minute"]
+    
+    def _day_values(self, ticker, ticker_day, align="position"):
+        """
+        
+        Returns the Close prices of a ticker for one ticker_dates entry and the 
+        rows they occupy in the day matrix. With align="position" rows are the 
+        bar count after the open (final bar excluded), with align="minute" rows
+        are the offsets of each bar's Datetime on the 09:30-16:00 minute grid.
+        On a Panel only the minutes of the grid that have a bar are returned
+        """
+        
+        arrays = self._ticker_arrays(ticker)
+        grid = getattr(self.data, "grid", False)
+        
+        if align == "position":
+            values = arrays["Close"][ticker_day[3]:ticker_day[4]-1]
+            if grid:
+                values = values[~np.isnan(values)]
             
-            epsilon = [k for k, v in ticker_corr.items() if v == median_corr][0]
-            epsilon_corr = ticker_corr[epsilon]
+            return np.arange(len(values)), values
+        
+        minutes = self._ticker_minutes(ticker)[ticker_day[3]:ticker_day[4]]
+        values = arrays["Close"][ticker_day[3]:ticker_day[4]]
+        offsets = minutes - (minutes[0] // 1440 * 1440 + MARKET_OPEN)
+        in_session = (offsets >= 0) & (offsets < DAY_MINUTES)
+        if grid:
+            in_session &= ~np.isnan(values)
+        
+        return offsets[in_session], values[in_session]
+
+    def _day_transform(self, ticker, ticker_day, align="position", method="pearson"):
+        """
+        
+        Returns _day_values for a ticker-day after the correlation method's 
+        transform: "pearson" and "spearman" use Close prices as they are (the
+        ranks depend on which minutes pair with alpha, so are taken in 
+        spearman_to_alpha) and "log_return" the one minute log returns (only 
+        between consecutive minutes when aligned by minute). Transforms are 
+        cached per ticker by (ticker_dates entry, method, align) and shared 
+        across alphas and runs
+        """
+        
+        if method in ("pearson", "spearman"):
+            return self._day_values(ticker, ticker_day, align)
+        
+        # loads the arrays first, which drops stale transforms of the ticker
+        self._ticker_arrays(ticker)
+        transforms = self._transforms.setdefault(ticker, {})
+        key = (tuple(ticker_day), method, align)
+        if key in transforms:
+            return transforms[key]
+        
+        rows, values = self._day_values(ticker, ticker_day, align)
+        
+        if method == "log_return":
+            consecutive = np.diff(rows) == 1
+            rows = rows[1:][consecutive]
+            if align == "position":
+                rows = rows - 1
+            # in float64 as Panel and LazyData prices are float32
+            values = np.diff(np.log(values, dtype="float64"))[consecutive]
+        else:
+            raise ValueError("method must be 'pearson', 'log_return' or 'spearman', "
+                             + f"not {method}")
+        
+        transforms[key] = rows, values
+        
+        return rows, values
+
+    def _universe_hash(self, tickers):
+        """Short hash identifying the set of tickers in the pack"""
+        
+        return hashlib.sha1(",".join(sorted(tickers)).encode()).hexdigest()[:16]
+
+    def _day_key(self, date, tickers, universe, align, method):
+        """
+        
+        Cache key for one alpha day. The number of bars of alpha and a hash of
+        the pack tickers' bar counts that day are included so a day that was 
+        only partly downloaded is recalculated once complete
+        """
+        
+        day = date[:3]
+        counts = np.zeros(len(tickers), dtype="int64")
+        for column, ticker in enumerate(tickers):
+            ticker_day = self.ticker_dates[ticker].get(day)
+            if ticker_day is not None:
+                counts[column] = ticker_day[4] - ticker_day[3]
+        bars = hashlib.sha1(counts.tobytes()).hexdigest()[:16]
+        
+        return (self.alpha, (date[2], date[0], date[1]), universe, align, method,
+                date[4] - date[3], bars)
+
+    def _pack_day(self, date, tickers, align="position", method="pearson"):
+        """
+        
+        Calculates the pack correlation for one alpha ticker_dates entry and 
+        returns the corr_date row plus the list of valid correlations
+        """
+        
+        alpha_arrays = self._ticker_arrays(self.alpha)
+        day = date[:3]
+        
+        alpha_open = date[3]
+        alpha_close = date[4]-1
+        # in float64, Panel, SharedCache and LazyData prices are float32
+        alpha_gain = float(alpha_arrays["Close"][alpha_close]) \
+                      / float(alpha_arrays["Open"][alpha_open])
+        
+        alpha_rows, alpha_values = self._day_transform(self.alpha, date, align, method)
+        len_day = len(alpha_values)
+        num_rows = len_day if align == "position" else DAY_MINUTES
+        alpha_slice = np.full(num_rows, np.nan)
+        alpha_slice[alpha_rows] = alpha_values
+              
+        if alpha_gain > 1:
+            direction = 1
+        else:
+            direction = -1
+        
+        pack = []
+        day_slices = []
+        with self.metrics.timer("correlate"):
+            for ticker in tickers:
+                ticker_day = self.ticker_dates[ticker].get(day)
+                if ticker_day is None:
+                    self.metrics.count("ticker_days_missing")
+                    continue
+                
+                rows, values = self._day_transform(ticker, ticker_day, align, method)
+                
+                # check that slice is full day of data
+                if len(values) > len_day - 10:
+                    pack.append(ticker)
+                    day_slices.append((rows, values))
+                else:
+                    self.metrics.count("ticker_days_skipped")
             
-            abs_ticker_corr = {key: abs(val) for key, val in ticker_corr.items() 
-                                if val != 0}
-            sigma = min(abs_ticker_corr, key=abs_ticker_corr.get)
-            sigma_corr = ticker_corr[sigma]
+            # rows are minutes after the open, missing minutes are left as NaN
+            day_matrix = np.full((num_rows, len(pack)), np.nan)
+            for column, (rows, values) in enumerate(day_slices):
+                keep = rows < num_rows
+                day_matrix[rows[keep], column] = values[keep]
             
-            omega = min(ticker_corr, key=ticker_corr.get)
-            omega_corr = ticker_corr[omega]
+            if method == "spearman":
+                corrs = spearman_to_alpha(alpha_slice, day_matrix)
+            else:
+                corrs = corr_to_alpha(alpha_slice, day_matrix)
+        
+        self.metrics.count("days_calculated")
+        self.metrics.count("correlations", len(corrs))
+        
+        with self.metrics.timer("aggregate"):
+            return self._pack_row(day, corrs, pack, alpha_gain, direction)
+        
+    def _pack_row(self, day, corrs, pack, alpha_gain, direction):
+        """Reduces one day's correlations to the corr_date row and valid correlations"""
+        
+        corr_list = corrs[~np.isnan(corrs)]
+        self.metrics.count("nan_correlations_dropped", len(corrs) - len(corr_list))
+        
+        stats, picks = pack_stats(corrs)
+        day_corr = float(stats[0])
+        names = [pack[pick] if pick >= 0 else None for pick in picks]
+        
+        if day_corr > 0:
+            day_corr_dir = day_corr * direction
+        else:
+            day_corr_dir = 0
+        
+        row = (day, day_corr, day_corr_dir, float(stats[1]), float(stats[2]), 
+               alpha_gain, names[0], float(stats[3]), names[1], float(stats[4]), 
+               names[2], float(stats[5]), names[3], float(stats[6]))
+        
+        return row, corr_list
 
-            self.dist_date[(day[2], day[0], day[1])] = corr_list
-            
-            if day_corr > 0:
-                day_corr_dir = day_corr * direction
+    def pack_day(self, date, align=None, method=None):
+        """
+        
+        Returns the corr_date row for a single [month, day, year] date as a 
+        Series, or None when there is no valid correlation for it. Results come 
+        from, and are added to, the day cache so corr_date is left untouched
+        """
+        
+        if align is None:
+            align = self.align
+        if method is None:
+            method = self.method
+        
+        alpha_day = self.ticker_dates[self.alpha].get(date)
+        if alpha_day is None:
+            return None
+        
+        tickers = [ticker for ticker in self.data.keys() if ticker != self.alpha]
+        key = self._day_key(alpha_day, tickers, self._universe_hash(tickers), 
+                            align, method)
+        if key not in self.day_cache:
+            self.day_cache[key] = self._pack_day(alpha_day, tickers, align, method)
+        
+        row = self.day_cache[key][0]
+        if isnan(row[1]):
+            return None
+        
+        return pd.Series(row, index=self.corr_columns)
+
+    def save_cache(self, cache_path):
+        """Save/pickle the computed day results for future use"""
+        
+        with open(cache_path, "wb") as filehandler:
+            pickle.dump(self.day_cache, filehandler)
+        
+        return
+    
+    def load_cache(self, cache_path):
+        """Load previously saved day results, keeping any already computed"""
+        
+        with open(cache_path, "rb") as file_in:
+            self.day_cache.update(pickle.load(file_in))
+        
+        return
+
+    def _fill_cache_parallel(self, dates, tickers, universe, align, method, n_jobs):
+        """
+        
+        Calculates the uncached days in dates across n_jobs processes. Workers
+        read prices from the memory-mapped Panel or from one shared memory 
+        block rather than from pickled copies of data. Returns the set of day
+        keys calculated
+        """
+        
+        missing = [date for date in dates 
+                   if self._day_key(date, tickers, universe, align, method) 
+                   not in self.day_cache]
+        if len(missing) == 0:
+            return set()
+        
+        shared = None
+        if isinstance(self.data, Panel):
+            source = ("panel", self.data.panel_path)
+        elif isinstance(self.data, SharedCache):
+            source = ("shared", self.data.spec())
+        else:
+            arrays = {}
+            for ticker in [self.alpha] + tickers:
+                for field, values in self._ticker_arrays(ticker).items():
+                    arrays[(ticker, field)] = values
+                if align == "minute":
+                    arrays[(ticker, "Minute")] = self._ticker_minutes(ticker)
+            shared = SharedArrays.create(arrays)
+            source = ("shared", shared.spec())
+        
+        ticker_dates = {ticker: self.ticker_dates[ticker] 
+                        for ticker in [self.alpha] + tickers}
+        chunk = -(-len(missing) // n_jobs)
+        shards = [missing[i:i+chunk] for i in range(0, len(missing), chunk)]
+        
+        computed = set()
+        try:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                futures = [executor.submit(_pack_worker, source, self.alpha, 
+                                           ticker_dates, tickers, align, method, 
+                                           shard, self.metrics.enabled)
+                           for shard in shards]
+                for shard, future in zip(shards, futures):
+                    results, metrics = future.result()
+                    self.metrics.merge(metrics)
+                    for date, result in zip(shard, results):
+                        key = self._day_key(date, tickers, universe, align, method)
+                        self.day_cache[key] = result
+                        computed.add(key)
+        finally:
+            if shared is not None:
+                shared.close()
+        
+        return computed
+
+    def find_pack_correlation(self, start_index=None, end_index=None, plot_av=True,
+                              align="position", n_jobs=1, method="pearson"):
+        """
+        
+        Calculates pack correlation and the correlation distribution for each 
+        day in the timeframe specified by start_index and end_index. For each
+        day one (minutes x tickers) matrix of Close prices is built and the 
+        correlation of every ticker to alpha is found in a single pass.
+        
+        align="position" pairs bars by their count after the open while 
+        align="minute" pairs them by Datetime minute so that gaps in illiquid
+        tickers do not shift the rest of the day.
+        
+        method selects Pearson correlation of Close prices ("pearson"), of one
+        minute log returns ("log_return") or of price ranks ("spearman").
+        
+        Day results are cached by (alpha, date, universe hash) so repeat runs 
+        only calculate days that have not been seen before. With n_jobs > 1 
+        the uncached days are split across a pool of processes
+        """
+        
+        if align not in ("position", "minute"):
+            raise ValueError(f"align must be 'position' or 'minute', not {align}")
+        if method not in ("pearson", "log_return", "spearman"):
+            raise ValueError("method must be 'pearson', 'log_return' or 'spearman', "
+                             + f"not {method}")
+        
+        self.align = align
+        self.method = method
+        dist_dates = []
+        dists = []
+        
+        tickers = [ticker for ticker in self.data.keys() if ticker != self.alpha]
+        universe = self._universe_hash(tickers)
+        ticker_codes = {ticker: code for code, ticker in enumerate(tickers)}
+        dates = self.ticker_dates[self.alpha][start_index:end_index]
+        
+        computed = set()
+        if n_jobs > 1:
+            computed = self._fill_cache_parallel(dates, tickers, universe, align, 
+                                                 method, n_jobs)
+        
+        # typed columns filled in place and made into a dataframe once at the end
+        num_days = len(dates)
+        days = np.empty(num_days, dtype=object)
+        valid = np.zeros(num_days, dtype=bool)
+        columns = {}
+        for column in self.corr_columns[1:]:
+            if column in self.ticker_columns:
+                columns[column] = np.full(num_days, -1, dtype="int32")
             else:
-                day_corr_dir = 0
+                columns[column] = np.full(num_days, np.nan)
+
+        for index_num, date in enumerate(dates):
+            key = self._day_key(date, tickers, universe, align, method)
+            if key not in self.day_cache:
+                self.day_cache[key] = self._pack_day(date, tickers, align, method)
+            elif key not in computed:
+                self.metrics.count("days_cached")
             
-            if isnan(day_corr) is True:
-                pass
-            else:
-                self.corr_date.loc[index_num] = day, day_corr, day_corr_dir, median_corr, \
-                                            stdev_corr, alpha_gain, beta, beta_corr, \
-                                            epsilon, epsilon_corr, sigma, sigma_corr, \
-                                            omega, omega_corr
+            row, corr_list = self.day_cache[key]
+            dist_dates.append((date[2], date[0], date[1]))
+            dists.append(corr_list)
+            
+            if isnan(row[1]) is True:
+                continue
             
-            index_num += 1
+            days[index_num] = row[0]
+            valid[index_num] = True
+            for column, value in zip(self.corr_columns[1:], row[1:]):
+                if column in self.ticker_columns:
+                    columns[column][index_num] = ticker_codes.get(value, -1)
+                else:
+                    columns[column][index_num] = value
+        
+        self.dist_date = RaggedDist.from_lists(dist_dates, dists)
+        self.corr_date = pd.DataFrame({"Day": days[valid]}, 
+                                      index=np.flatnonzero(valid))
+        for column, values in columns.items():
+            if column in self.ticker_columns:
+                self.corr_date[column] = pd.Categorical.from_codes(
+                                         values[valid], categories=tickers)
+            else:
+                self.corr_date[column] = values[valid]
         
         if plot_av == True:   
             if len(self.corr_date) <= 20:
@@ -158,6 +869,150 @@ class PackCorrelation:
         return
             
             
+    def find_all_alpha_correlation(self, start_index=None, end_index=None, 
+                                   method="pearson"):
+        """
+        
+        Calculates the pack statistics with every ticker in turn as alpha for 
+        each of alpha's days between start_index and end_index. Each day the 
+        transformed Close prices of all tickers are put on the minute grid, 
+        gaps left as NaN, and the full correlation matrix over the minutes each
+        pair shares is found from masked matrix products ("spearman" ranks 
+        depend on the pair, so its rows are found one alpha at a time). As in 
+        find_pack_correlation each alpha's pack leaves out tickers with 10 or 
+        more fewer bars than that alpha, so row a equals the pack statistics of
+        find_pack_correlation(align="minute") with ticker a as alpha.
+        
+        Sets and returns self.all_alpha_stats, a (days x tickers x 7) array 
+        with the columns of all_alpha_columns, and sets self.all_alpha_codes, 
+        a (days x tickers x 4) array of the positions in self.all_alpha_tickers
+        of the Beta, Epsilon, Sigma and Omega tickers (-1 when missing)
+        """
+        
+        tickers = list(self.data.keys())
+        dates = self.ticker_dates[self.alpha][start_index:end_index]
+        
+        stats = np.full((len(dates), len(tickers), len(self.all_alpha_columns)), 
+                        np.nan)
+        codes = np.full((len(dates), len(tickers), len(self.ticker_columns)), -1,
+                        dtype="int32")
+        
+        for day_num, date in enumerate(dates):
+            day = date[:3]
+            grid = np.full((DAY_MINUTES, len(tickers)), np.nan)
+            counts = np.zeros(len(tickers), dtype="int64")
+            present = np.zeros(len(tickers), dtype=bool)
+            
+            for column, ticker in enumerate(tickers):
+                ticker_day = self.ticker_dates[ticker].get(day)
+                if ticker_day is not None:
+                    rows, values = self._day_transform(ticker, ticker_day, "minute", 
+                                                       method)
+                    grid[rows, column] = values
+                    counts[column] = len(values)
+                    present[column] = True
+            
+            # each alpha's pack holds the tickers with a full day of data 
+            # relative to that alpha's own bars
+            pack = present[None, :] & (counts[None, :] > counts[:, None] - 10)
+            pack &= present[:, None]
+            np.fill_diagonal(pack, False)
+            if not pack.any():
+                continue
+            
+            if method == "spearman":
+                corr = np.full((len(tickers), len(tickers)), np.nan)
+                for alpha in np.flatnonzero(pack.any(axis=1)):
+                    members = np.flatnonzero(pack[alpha])
+                    corr[alpha, members] = spearman_to_alpha(grid[:, alpha], 
+                                                             grid[:, members])
+            else:
+                corr = corr_matrix(grid)
+            corr[~pack] = np.nan
+            
+            stats[day_num], codes[day_num] = pack_stats_rows(corr)
+        
+        self.all_alpha_tickers = tickers
+        self.all_alpha_days = [date[:3] for date in dates]
+        self.all_alpha_stats = stats
+        self.all_alpha_codes = codes
+        
+        return stats
+    
+    def rolling_correlation(self, date=None, window=30, step=1, chunk_size=500):
+        """
+        
+        Returns the correlation surface of every ticker to alpha through one 
+        of alpha's days as a dataframe with one row per window of window 
+        minutes, stepped every step minutes, and one column per ticker. Prices
+        are aligned on the minute grid and tickers are processed chunk_size at
+        a time to bound memory for large universes. Rows are labelled by the
+        time of the last minute in each window
+        """
+        
+        if date is None:
+            date = self.ticker_dates[self.alpha][-1][:3]
+        
+        alpha_day = self.ticker_dates[self.alpha].get(date)
+        alpha_rows, alpha_values = self._day_values(self.alpha, alpha_day, "minute")
+        alpha_grid = np.full(DAY_MINUTES, np.nan)
+        alpha_grid[alpha_rows] = alpha_values
+        
+        tickers = [ticker for ticker in self.data.keys() if ticker != self.alpha]
+        ends = np.arange(window, DAY_MINUTES + 1, step)
+        surface = np.full((len(ends), len(tickers)), np.nan)
+        
+        for chunk_start in range(0, len(tickers), chunk_size):
+            chunk = tickers[chunk_start:chunk_start + chunk_size]
+            grid = np.full((DAY_MINUTES, len(chunk)), np.nan)
+            for column, ticker in enumerate(chunk):
+                ticker_day = self.ticker_dates[ticker].get(date)
+                if ticker_day is not None:
+                    rows, values = self._day_values(ticker, ticker_day, "minute")
+                    grid[rows, column] = values
+            
+            surface[:, chunk_start:chunk_start + len(chunk)] = \
+                rolling_corr_to_alpha(alpha_grid, grid, window, step)
+        
+        times = [f"{(MARKET_OPEN + end - 1) // 60:02d}:{(MARKET_OPEN + end - 1) % 60:02d}"
+                 for end in ends]
+        
+        return pd.DataFrame(surface, index=times, columns=tickers)
+    
+    def replay_day(self, date=None):
+        """
+        
+        Replays one of alpha's days minute by minute through a 
+        StreamingPackCorrelation, yielding the minute offset after the open and
+        the streaming engine after each minute. At the end of the day its 
+        current() matches pack_day(date, align="minute")
+        """
+        
+        if date is None:
+            date = self.ticker_dates[self.alpha][-1][:3]
+        
+        alpha_day = self.ticker_dates[self.alpha].get(date)
+        tickers = [ticker for ticker in self.data.keys() if ticker != self.alpha]
+        live = StreamingPackCorrelation(tickers, self.alpha, day=date[:3])
+        
+        grid = np.full((DAY_MINUTES, len(tickers) + 1), np.nan)
+        for column, ticker in enumerate([self.alpha] + tickers):
+            ticker_day = self.ticker_dates[ticker].get(date)
+            if ticker_day is not None:
+                rows, values = self._day_values(ticker, ticker_day, "minute")
+                grid[rows, column] = values
+        
+        alpha_open = self._ticker_arrays(self.alpha)["Open"][alpha_day[3]]
+        names = [self.alpha] + tickers
+        
+        for minute in range(DAY_MINUTES):
+            present = np.flatnonzero(~np.isnan(grid[minute]))
+            closes = {names[column]: grid[minute, column] for column in present}
+            live.update(closes, alpha_open)
+            
+            yield minute, live
+            
+            
     def plot_day_corr(self, date=None, plot_alpha=True, plot_beta=False,
                   plot_epsilon=False, plot_sigma=False, plot_omega=False):
         """
@@ -175,42 +1030,23 @@ class PackCorrelation:
             date_list = date.split("-")
             date = [int(date_list[1]), int(date_list[2]), int(date_list[0])]   
 
-        if hasattr(self, "corr_date"):
-            all_days = list(self.corr_date["Day"])
-            
-            if date not in all_days:
-                date_index = [self.ticker_dates[self.alpha].index(x) \
-                              for x in self.ticker_dates[self.alpha] \
-                              if x[:3] == date][0]
-                self.find_pack_correlation(start_index=date_index, 
-                                       end_index=date_index+1, plot_av=False)
-
-        else:
-            date_index = [self.ticker_dates[self.alpha].index(x) \
-                          for x in self.ticker_dates[self.alpha] \
-                              if x[:3] == date][0]
-                
-            self.find_pack_correlation(start_index=date_index, 
-                                       end_index=date_index+1, plot_av=False)
-        
-        all_days = list(self.corr_date["Day"])
-        
-        date_index = all_days.index(date)
+        # a single day is found from the day cache without replacing corr_date
+        day_row = self.pack_day(date)
         
-        if self.corr_date["Av Corr"].iloc[date_index] == 0:
+        if day_row is None or day_row["Av Corr"] == 0:
             return f"{date} has no valid correlation data calculated"
         
         a = self.alpha
-        b = self.corr_date["Beta"].iloc[date_index]
-        e = self.corr_date["Epsilon"].iloc[date_index]
-        s = self.corr_date["Sigma"].iloc[date_index]
-        o = self.corr_date["Omega"].iloc[date_index]
+        b = day_row["Beta"]
+        e = day_row["Epsilon"]
+        s = day_row["Sigma"]
+        o = day_row["Omega"]
         
-        av_val = self.corr_date["Av Corr"].iloc[date_index]
-        b_val = self.corr_date["Beta Corr"].iloc[date_index]
-        e_val = self.corr_date["Epsilon Corr"].iloc[date_index]
-        s_val = self.corr_date["Sigma Corr"].iloc[date_index]
-        o_val = self.corr_date["Omega Corr"].iloc[date_index]
+        av_val = day_row["Av Corr"]
+        b_val = day_row["Beta Corr"]
+        e_val = day_row["Epsilon Corr"]
+        s_val = day_row["Sigma Corr"]
+        o_val = day_row["Omega Corr"]
     
         plot_pack = {}  
         plot_list = []
@@ -225,8 +1061,8 @@ class PackCorrelation:
         if plot_omega: plot_list.append(o), print(f"Omega: {o} ({o_val:.2f})")
     
         for t in plot_list:
-            date_info = [x for x in self.ticker_dates[t] if x[:3] == date][0]
-            slice_start, slice_end = date_info[3], date_info[4]-1
+            slice_start, slice_end = self.ticker_dates[t].open_close(date)
+            slice_end -= 1
             temp = self.data[t][slice_start:slice_end]
             norm_temp =  (temp["Close"] - temp["Close"].min()) \
                         / (temp["Close"].max() - temp["Close"].min())
@@ -255,8 +1091,8 @@ class PackCorrelation:
         plt.xlabel("Correlation")
         plt.ylabel("Frequency")
         plt.legend
-        hist_mean = mean(dists)
-        hist_median = median(dists)
+        hist_mean = np.mean(dists)
+        hist_median = np.median(dists)
         hist_mode = hist_vals[list(hist_bins).index(max(hist_bins))]
         print(f"\nSelected day: {date}\n")
         print(f"Mean: {round(hist_mean, 2)}")
@@ -266,19 +1102,32 @@ class PackCorrelation:
         return
     
     
-    def plot_heatmap(self, start_index=None, end_index=None, bins=100):
-        """Plots a heatmap of the correlation distributions as a function of days"""
-
+    def heatmap_matrix(self, start_index=None, end_index=None, bins=100):
+        """
+        
+        Returns the (bin edges x days) dataframe of correlation counts drawn by 
+        plot_heatmap. Each column is np.histogram of that day's correlations 
+        with a 0 appended for the final edge. Counts for all days are found 
+        together and cached with dist_date
+        """
+        
         range_bins = 2000 // bins
         binning = [x/1000 for x in range(-1000, 1000, range_bins)]
-        heatmap = pd.DataFrame(index=binning)
         
-        temp_dates = list(self.dist_date.keys())[start_index:end_index]
+        counts = self.dist_date.histograms(binning)[start_index:end_index]
+        temp_dates = self.dist_date.dates[start_index:end_index]
         
-        for date in temp_dates:
-            cut = np.histogram(self.dist_date[date], binning)[0]
-            cut = np.append(cut, 0)
-            heatmap[date] = cut.tolist()
+        matrix = np.zeros((len(binning), len(temp_dates)), dtype="int64")
+        matrix[:-1] = counts.T
+        
+        return pd.DataFrame(matrix, index=binning, 
+                            columns=pd.Index(temp_dates, tupleize_cols=False))
+    
+    
+    def plot_heatmap(self, start_index=None, end_index=None, bins=100):
+        """Plots a heatmap of the correlation distributions as a function of days"""
+
+        heatmap = self.heatmap_matrix(start_index, end_index, bins)
         
         heatmap = sns.heatmap(heatmap, xticklabels=False, yticklabels=False,
                               robust=True, cbar_kws={"label":"Frequency"})
@@ -294,7 +1143,7 @@ class PackCorrelation:
         if ticker is None:
             ticker = self.alpha
         if ticker not in self.data.keys():
-            print(f"{ticker} not found in data")
+            logger.warning(f"{ticker} not found in data")
             
             return None
     
@@ -303,21 +1152,19 @@ class PackCorrelation:
         else:
             start = start_date.split("-")
             start_list = [int(start[1]), int(start[2]), int(start[0])]   
-            start_index = [x[3] for x in self.ticker_dates[ticker] 
-                           if x[:3] == start_list][0]
+            start_index = self.ticker_dates[ticker].open_close(start_list)[0]
         
         if end_date is None:
             end_index = self.ticker_dates[ticker][-1][4] - 1
         else:
             end = end_date.split("-")
             end_list = [int(end[1]), int(end[2]), int(end[0])]
-            end_index = [x[4]-1 for x in self.ticker_dates[ticker] 
-                         if x[:3] == end_list][0]
+            end_index = self.ticker_dates[ticker].open_close(end_list)[1] - 1
         
         temp = self.data[ticker][start_index:end_index]
         temp = temp.reset_index(drop=True)
         
-        print(f"Data slice for {ticker}")
+        logger.info(f"Data slice for {ticker}")
         
         return temp
     
@@ -329,7 +1176,7 @@ class PackCorrelation:
         if ticker is None:
             ticker = self.alpha
         if ticker not in self.data.keys():
-            print(f"{ticker} not found in data")
+            logger.warning(f"{ticker} not found in data")
             return None
         
         plot_data = self.slice_data(ticker, start_time, 
@@ -343,8 +1190,124 @@ class PackCorrelation:
             plt.ylabel("Stock Price (USD)")
         plt.legend()
         
-        print(f"{plot_series}-data plotted for {ticker}")
+        logger.info(f"{plot_series}-data plotted for {ticker}")
         
         return
 
 
+class StreamingPackCorrelation:
+    """
+    
+    Builds the pack correlation live during a session. Running sums of x, y,
+    xy, x^2 and y^2 are kept for every ticker against alpha over the minutes 
+    where both have a bar, so each update and each call to current() costs 
+    O(tickers). Prices are taken relative to each ticker's first bar to keep 
+    the sums well conditioned.
+    """
+    
+    def __init__(self, tickers, alpha, day=None):
+        self.alpha = alpha
+        self.day = day
+        self.tickers = [ticker for ticker in tickers if ticker != alpha]
+        self._codes = {ticker: code for code, ticker in enumerate(self.tickers)}
+        
+        num_tickers = len(self.tickers)
+        self.bars = np.zeros(num_tickers)
+        self.count = np.zeros(num_tickers)
+        self.sum_x = np.zeros(num_tickers)
+        self.sum_y = np.zeros(num_tickers)
+        self.sum_xy = np.zeros(num_tickers)
+        self.sum_xx = np.zeros(num_tickers)
+        self.sum_yy = np.zeros(num_tickers)
+        self.ref_x = np.full(num_tickers, np.nan)
+        
+        self.alpha_bars = 0
+        self.ref_y = None
+        self.alpha_open = None
+        self.alpha_close = None
+        
+    def __repr__(self):
+        return f"Streaming pack of {len(self.tickers)} tickers after " \
+               + f"{self.alpha_bars} bars with alpha as {self.alpha}"
+    
+    def update(self, closes, alpha_open=None):
+        """
+        
+        Adds one minute of bars. closes maps ticker to Close price (a dict or
+        Series) and only pairs with alpha when alpha is included. alpha_open is
+        used as the day's opening price for Alpha Gain, otherwise alpha's first
+        Close is used
+        """
+        
+        codes = []
+        values = []
+        for ticker, close in closes.items():
+            code = self._codes.get(ticker)
+            if code is not None and not isnan(close):
+                codes.append(code)
+                values.append(close)
+        
+        codes = np.array(codes, dtype="int64")
+        x = np.array(values, dtype="float64")
+        self.bars[codes] += 1
+        
+        y = closes.get(self.alpha, np.nan)
+        if isnan(y):
+            return
+        
+        if self.ref_y is None:
+            self.ref_y = y
+            self.alpha_open = y if alpha_open is None else alpha_open
+        self.alpha_bars += 1
+        self.alpha_close = y
+        
+        first = np.isnan(self.ref_x[codes])
+        self.ref_x[codes[first]] = x[first]
+        dx = x - self.ref_x[codes]
+        dy = y - self.ref_y
+        
+        self.count[codes] += 1
+        self.sum_x[codes] += dx
+        self.sum_y[codes] += dy
+        self.sum_xy[codes] += dx * dy
+        self.sum_xx[codes] += dx * dx
+        self.sum_yy[codes] += dy * dy
+        
+        return
+    
+    def correlations(self):
+        """
+        
+        Returns the current correlation of every ticker to alpha, NaN for those
+        without enough bars or with 10 or more fewer bars than alpha
+        """
+        
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cov = self.sum_xy - self.sum_x * self.sum_y / self.count
+            var_x = self.sum_xx - self.sum_x**2 / self.count
+            var_y = self.sum_yy - self.sum_y**2 / self.count
+            corrs = np.clip(cov / np.sqrt(var_x * var_y), -1, 1)
+        
+        corrs[(self.count < 2) | (self.bars <= self.alpha_bars - 10)] = np.nan
+        
+        return corrs
+    
+    def current(self):
+        """Returns the current pack as a Series like a row of corr_date"""
+        
+        corrs = self.correlations()
+        stats, codes = pack_stats(corrs)
+        
+        if self.alpha_open is None or isnan(stats[0]):
+            return None
+        
+        alpha_gain = float(self.alpha_close) / float(self.alpha_open)
+        direction = 1 if alpha_gain > 1 else -1
+        day_corr_dir = stats[0] * direction if stats[0] > 0 else 0
+        names = [self.tickers[code] if code >= 0 else None for code in codes]
+        
+        row = (self.day, stats[0], day_corr_dir, stats[1], stats[2], alpha_gain,
+               names[0], stats[3], names[1], stats[4], names[2], stats[5], 
+               names[3], stats[6])
+        
+        return pd.Series(row, index=PackCorrelation.corr_columns)
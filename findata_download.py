@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+
+Rate-limited network layer used by FinDataExtract for downloads. The fetch
+function is injectable so downloads can be run against a local fake source.
+
+@author: Leo
+"""
+
+import threading
+import time
+import yfinance as yf
+
+
+class TokenBucket:
+    """
+
+    Thread-safe token bucket allowing on average rate requests per second with
+    bursts of up to capacity requests. A rate of None never blocks.
+    """
+
+    def __init__(self, rate=None, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it"""
+
+        if self.rate is None:
+            return
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Downloader:
+    """
+
+    Calls fetch (yf.download by default) through a shared TokenBucket and
+    retries failed calls with exponential backoff. Any callable with the
+    yf.download signature can be used as fetch.
+    """
+
+    def __init__(self, fetch=None, rate=None, capacity=1, retries=3, backoff=1.0):
+        self.fetch = yf.download if fetch is None else fetch
+        self.bucket = TokenBucket(rate, capacity)
+        self.retries = retries
+        self.backoff = backoff
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Downloader with rate {self.bucket.rate}/s and {self.retries} retries"
+
+    def download(self, *args, **kwargs):
+        """
+
+        Rate-limited fetch(*args, **kwargs), retried on any exception. An empty
+        result, which is how yf.download reports most failures, raises
+        ValueError and is retried too
+        """
+
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            with self.lock:
+                self.requests += 1
+            try:
+                data = self.fetch(*args, **kwargs)
+                if data is None or len(data) == 0:
+                    raise ValueError("no data returned")
+                return data
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2**attempt)
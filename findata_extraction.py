@@ -7,26 +7,488 @@ Created on Thu Mar 24 18:59:16 2022
 
 from os import scandir, getcwd, path
 import csv
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
 import datetime as dt
+import io
+import json
+import logging
 import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
-import yfinance as yf
 import matplotlib.pyplot as plt
+from findata_download import Downloader
+from findata_calendar import ExchangeCalendar, MARKET_OPEN
+from findata_metrics import Metrics
+
+logger = logging.getLogger("findata.extraction")
+
+# in-memory dtypes of 1m bars, Adj Close equals Close for intraday bars and 
+# is dropped. Volume is read from csv as float, as it may be missing, and 
+# converted once the frame is built. float32 keeps about 7 significant digits,
+# so prices are rounded by up to 6e-8 of their value and correlations and 
+# pack statistics differ from float64 prices by around 1e-6
+INGEST_SCHEMA = {"Open": "float32", "High": "float32", "Low": "float32", 
+                 "Close": "float32", "Volume": "uint32"}
+DROP_COLUMNS = ["Adj Close"]
+
+
+class TickerDates(list):
+    """
+    
+    List of [month, day, year, open index, close index] entries for a single 
+    ticker, as produced by pop_ticker_dates, that also keeps a dictionary from
+    each (month, day, year) to its position in the list. Days can then be
+    found in O(1) rather than by scanning the list.
+    """
+    
+    def __init__(self, entries=()):
+        super().__init__(entries)
+        self._reindex()
+        
+    def __reduce__(self):
+        return (TickerDates, (list(self),))
+        
+    def _reindex(self):
+        self._positions = {}
+        for position, entry in enumerate(self):
+            self._positions.setdefault(tuple(entry[:3]), position)
+    
+    def append(self, entry):
+        super().append(entry)
+        self._positions.setdefault(tuple(entry[:3]), len(self) - 1)
+        
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+            
+    def __iadd__(self, entries):
+        self.extend(entries)
+        return self
+    
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._reindex()
+        
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._reindex()
+        
+    def insert(self, position, entry):
+        super().insert(position, entry)
+        self._reindex()
+        
+    def pop(self, position=-1):
+        entry = super().pop(position)
+        self._reindex()
+        return entry
+    
+    def remove(self, entry):
+        super().remove(entry)
+        self._reindex()
+        
+    def clear(self):
+        super().clear()
+        self._positions = {}
+        
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._reindex()
+        
+    def reverse(self):
+        super().reverse()
+        self._reindex()
+        
+    def index_of(self, day):
+        """Returns the list position of a [month, day, year] day"""
+        
+        try:
+            return self._positions[tuple(day[:3])]
+        except KeyError:
+            raise ValueError(f"{list(day[:3])} is not in ticker dates") from None
+        
+    def get(self, day, default=None):
+        """Returns the full entry for a [month, day, year] day or default"""
+        
+        position = self._positions.get(tuple(day[:3]))
+        if position is None:
+            return default
+        
+        return self[position]
+    
+    def open_close(self, day):
+        """Returns the (open, close) index pair for a [month, day, year] day"""
+        
+        entry = self[self.index_of(day)]
+        
+        return entry[3], entry[4]
+        
+    def days(self):
+        """Returns the list of [month, day, year] days"""
+        
+        return [entry[:3] for entry in self]
+    
+    
+def as_ticker_dates(ticker_dates):
+    """Converts a dictionary of ticker_dates lists to TickerDates in place"""
+    
+    # lazy mappings already produce TickerDates and would load every ticker
+    if ticker_dates is None or isinstance(ticker_dates, LazyTickerDates):
+        return ticker_dates
+    
+    for ticker, dates in ticker_dates.items():
+        if not isinstance(dates, TickerDates):
+            ticker_dates[ticker] = TickerDates(dates)
+    
+    return ticker_dates
+
+
+def find_ticker_dates(new_data):
+    """
+    
+    Returns the [month, day, year, open, close] entries for a dataframe of 1m
+    bars with at least two rows, with open and close relative to its index
+    """
+    
+    begin_index = new_data.index[0]
+    end_index = new_data.index[-1]
+    
+    # day numbers of every bar, a change between neighbouring bars 
+    # marks the open of a new day (the final bar is never a new day)
+    stamps = pd.to_datetime(new_data["Datetime"]).values
+    day_nums = stamps.astype("datetime64[D]").astype("int64")
+    new_days = np.flatnonzero(day_nums[1:-1] != day_nums[:-2]) + 1
+    
+    starts = np.concatenate(([0], new_days))
+    opens = pd.DatetimeIndex(stamps[starts])
+    dates = [[month, day, year, start] for month, day, year, start 
+             in zip(opens.month.tolist(), opens.day.tolist(), 
+                    opens.year.tolist(), (starts + begin_index).tolist())]
+    
+    for num_day, close in enumerate((new_days + begin_index).tolist()):
+        dates[num_day].append(close)
+
+    # adding final index value for final day
+    dates[-1].append(end_index+1)
+    
+    return dates
+
+
+def scan_bars(stamps, volume, days, minutes):
+    """
+    
+    Data quality counts for one ticker's 1m bars, in the order they were 
+    stored, against the sessions days (datetime64[D]) each expecting minutes 
+    bars. Returns a dictionary of arrays with one value per entry of days 
+    followed by one per other day that has bars:
+        
+        Date, Expected, Bars (distinct in-session minutes), Missing, 
+        Duplicates, OutOfOrder, OffSession (bars outside the session), 
+        ZeroVolume and ZeroVolumeRun (longest run of zero volume bars)
+    """
+    
+    stamps = np.asarray(stamps).astype("datetime64[m]").astype("int64")
+    volume = np.asarray(volume)
+    session_days = np.asarray(days, dtype="datetime64[D]").astype("int64")
+    
+    # days with bars that are not sessions are added after the sessions
+    bar_days = stamps // 1440
+    extra_days = np.setdiff1d(np.unique(bar_days), session_days)
+    all_days = np.concatenate((session_days, extra_days))
+    expected = np.concatenate((np.asarray(minutes, dtype="int64"), 
+                               np.zeros(len(extra_days), dtype="int64")))
+    num_days = len(all_days)
+    
+    by_day = np.argsort(all_days, kind="stable")
+    slots = by_day[np.searchsorted(all_days[by_day], bar_days)]
+    
+    out_of_order = np.bincount(slots[1:][np.diff(stamps) < 0], minlength=num_days)
+    
+    order = np.argsort(stamps, kind="stable")
+    sorted_stamps = stamps[order]
+    repeat = np.concatenate(([False], sorted_stamps[1:] == sorted_stamps[:-1]))
+    duplicates = np.bincount(slots[order][repeat], minlength=num_days)
+    
+    # distinct bars, first stored copy of any duplicate
+    unique = order[~repeat]
+    unique_slots = slots[unique]
+    offsets = stamps[unique] % 1440 - MARKET_OPEN
+    in_session = (offsets >= 0) & (offsets < expected[unique_slots])
+    bars = np.bincount(unique_slots[in_session], minlength=num_days)
+    off_session = np.bincount(unique_slots[~in_session], minlength=num_days)
+    
+    # zero volume runs over consecutive in-session bars of a day
+    session_slots = unique_slots[in_session]
+    zero = volume[unique][in_session] == 0
+    zero_volume = np.bincount(session_slots[zero], minlength=num_days)
+    
+    run_start = zero & np.concatenate(([True], ~zero[:-1] 
+                                        | (session_slots[1:] != session_slots[:-1])))
+    run_ids = np.cumsum(run_start) - 1
+    zero_run = np.zeros(num_days, dtype="int64")
+    if zero.any():
+        lengths = np.bincount(run_ids[zero])
+        np.maximum.at(zero_run, session_slots[run_start], lengths)
+    
+    return {"Date": all_days.astype("datetime64[D]"), "Expected": expected, 
+            "Bars": bars, "Missing": np.maximum(expected - bars, 0), 
+            "Duplicates": duplicates, "OutOfOrder": out_of_order, 
+            "OffSession": off_session, "ZeroVolume": zero_volume, 
+            "ZeroVolumeRun": zero_run}
+
+
+def complete_bars(frame):
+    """
+    
+    Sort downloaded bars, dropping bars repeated where request windows meet 
+    and the bar of the current, still open, minute
+    """
+    
+    frame = frame[~frame.index.duplicated(keep="last")].sort_index()
+    
+    if len(frame) > 0:
+        now = pd.Timestamp.now(tz=frame.index.tz)
+        frame = frame[frame.index + pd.Timedelta(minutes=1) <= now]
+        
+    return frame
+
+
+def split_tickers(data, tickers):
+    """
+    
+    Split a multi-ticker download, with a column level holding the tickers, 
+    into one frame per ticker without the rows where that ticker had no bar
+    """
+    
+    if not isinstance(data.columns, pd.MultiIndex):
+        return {tickers[0]: data.dropna(how="all")}
+    
+    level = [num for num, names in enumerate(data.columns.levels) 
+             if set(tickers) & set(names)][0]
+    
+    frames = {}
+    for ticker in tickers:
+        if ticker in data.columns.get_level_values(level):
+            frames[ticker] = data.xs(ticker, axis=1, level=level).dropna(how="all")
+        else:
+            frames[ticker] = pd.DataFrame()
+        
+    return frames
+
+
+def csv_dtypes(names):
+    """Returns the read_csv dtype argument for a csv file with the given columns"""
+    
+    return {name: "float64" if dtype.startswith("uint") else dtype 
+            for name, dtype in INGEST_SCHEMA.items() if name in names}
+
+
+def apply_schema(frame):
+    """
+    
+    Returns frame with the INGEST_SCHEMA dtypes, a datetime64 Datetime column 
+    and without the DROP_COLUMNS. Columns that already match are not copied.
+    Prices become float32, which halves their memory at the cost of results 
+    around 1e-6 away from those of float64 prices
+    """
+    
+    frame = frame.drop(columns=[column for column in DROP_COLUMNS 
+                                if column in frame.columns])
+    
+    for column, dtype in INGEST_SCHEMA.items():
+        if column in frame.columns and frame[column].dtype != dtype:
+            if dtype.startswith("uint"):
+                frame[column] = frame[column].fillna(0).clip(lower=0)
+            frame[column] = frame[column].astype(dtype)
+    
+    if "Datetime" in frame.columns and frame["Datetime"].dtype == object:
+        frame["Datetime"] = parse_datetime(frame["Datetime"])
+    
+    return frame
+
+
+def parse_datetime(column):
+    """
+    
+    Converts a column of yfinance Datetime strings such as 
+    "2022-04-01 09:30:00-04:00" to datetime64 in one vectorized pass. The 
+    timezone suffix is dropped so that times stay in exchange local time.
+    """
+    
+    if pd.api.types.is_datetime64_any_dtype(column):
+        if column.dt.tz is not None:
+            return column.dt.tz_localize(None)
+        return column
+    
+    if len(column) and not isinstance(column.iloc[0], str):
+        return pd.to_datetime(column)
+    
+    return pd.to_datetime(column.str.slice(0, 16), format="%Y-%m-%d %H:%M")
+
+
+class LazyData(MutableMapping):
+    """
+    
+    Dictionary of ticker dataframes that reads a ticker from disk the first 
+    time it is accessed, optionally only between start_date and end_date. 
+    Loaded frames are kept in least recently used order and the oldest are 
+    dropped, to be read again when next needed, once their total size is 
+    above max_bytes. Frames assigned directly are never dropped.
+    """
+    
+    def __init__(self, loader, tickers, start_date=None, end_date=None, 
+                 max_bytes=None):
+        self._loader = loader
+        self._tickers = list(tickers)
+        self._known = set(self._tickers)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self._sizes = {}
+        self._pinned = {}
+        
+    def __repr__(self):
+        return f"LazyData of {len(self._tickers)} tickers, " \
+               + f"{len(self._frames) + len(self._pinned)} loaded"
+        
+    def __len__(self):
+        return len(self._tickers)
+    
+    def __iter__(self):
+        return iter(self._tickers)
+    
+    def __contains__(self, ticker):
+        return ticker in self._known
+    
+    def __getitem__(self, ticker):
+        if ticker in self._pinned:
+            return self._pinned[ticker]
+        if ticker in self._frames:
+            self._frames.move_to_end(ticker)
+            return self._frames[ticker]
+        if ticker not in self._known:
+            raise KeyError(ticker)
+        
+        frame = self._loader(ticker, self.start_date, self.end_date)
+        self._frames[ticker] = frame
+        self._sizes[ticker] = int(frame.memory_usage(deep=True).sum())
+        self._evict(keep=ticker)
+        
+        return frame
+    
+    def __setitem__(self, ticker, frame):
+        self._drop(ticker)
+        self._pinned[ticker] = frame
+        if ticker not in self._known:
+            self._tickers.append(ticker)
+            self._known.add(ticker)
+            
+    def __delitem__(self, ticker):
+        if ticker not in self._known:
+            raise KeyError(ticker)
+        self._drop(ticker)
+        self._pinned.pop(ticker, None)
+        self._tickers.remove(ticker)
+        self._known.discard(ticker)
+        
+    def _drop(self, ticker):
+        self._frames.pop(ticker, None)
+        self._sizes.pop(ticker, None)
+    
+    def _evict(self, keep=None):
+        """Drop least recently used frames until under the memory budget"""
+        
+        if self.max_bytes is None:
+            return
+        
+        while self.loaded_bytes() > self.max_bytes and len(self._frames) > 1:
+            ticker = next(iter(self._frames))
+            if ticker == keep:
+                break
+            self._drop(ticker)
+            
+    def resident(self, ticker):
+        """Returns ticker's frame if held in memory, else None, without reading it"""
+        
+        if ticker in self._pinned:
+            return self._pinned[ticker]
+        
+        return self._frames.get(ticker)
+    
+    def loaded(self):
+        """Returns the tickers currently held in memory"""
+        
+        return list(self._pinned) + list(self._frames)
+    
+    def loaded_bytes(self):
+        return sum(self._sizes.values())
+    
+    
+class LazyTickerDates(Mapping):
+    """
+    
+    ticker_dates for a LazyData, finding a ticker's TickerDates the first time 
+    it is accessed. Entries are small so they are kept once found.
+    """
+    
+    def __init__(self, data):
+        self.data = data
+        self._dates = {}
+        
+    def __len__(self):
+        return len(self.data)
+    
+    def __iter__(self):
+        return iter(self.data)
+    
+    def __getitem__(self, ticker):
+        if ticker not in self._dates:
+            if ticker not in self.data:
+                raise KeyError(ticker)
+            frame = self.data[ticker]
+            if len(frame) < 2:
+                self._dates[ticker] = TickerDates()
+            else:
+                self._dates[ticker] = TickerDates(find_ticker_dates(frame))
+        
+        return self._dates[ticker]
 
 
 class FinDataExtract:
     
-    def __init__(self, data=None, ticker_dates=None):
+    def __init__(self, data=None, ticker_dates=None, downloader=None, metrics=None):
         self.data = data
-        self.ticker_dates = ticker_dates
+        self.ticker_dates = as_ticker_dates(ticker_dates)
         self.file_path = getcwd()
         self.watchlist = None
+        self.store = None
+        self.downloader = Downloader() if downloader is None else downloader
+        self.failed_tickers = {}
+        self.watermarks = None
+        self._file_names = {}
+        self.calendar = ExchangeCalendar()
+        self.metrics = Metrics() if metrics is None else metrics
         
     def __repr__(self):
         return "FinDataExtraction object"
     
     def set_file_path(self, file_path):
         self.file_path = file_path
+        
+    def set_store(self, store, migrate=False):
+        """
+        
+        Use a columnar store such as findata_store.ParquetStore in place of the
+        csv files in file_path for downloads and loading. With migrate=True the
+        existing csv files in file_path are first copied into the store.
+        """
+        
+        self.store = store
+        if migrate:
+            store.migrate_csv(self.file_path)
 
     def pop_watchlist(self, watchlist_path=None):
         """populate and return watchlist from csv file at given destination path"""
@@ -46,107 +508,367 @@ class FinDataExtract:
         return self.watchlist
 
 
+    def _csv_files(self):
+        """Returns the ticker data files in file_path, skipping hidden files"""
+        
+        return [file for file in scandir(self.file_path) 
+                if file.is_file() and not file.name.startswith(".")]
+    
+    
+    def _last_timestamp(self, csv_path):
+        """Returns the Datetime of the last row of a csv file from its final bytes"""
+        
+        with open(csv_path, "rb") as file:
+            file.seek(0, 2)
+            file.seek(max(0, file.tell() - 4096))
+            lines = [line for line in file.read().splitlines() if line.strip()]
+        
+        try:
+            return dt.datetime.strptime(lines[-1].decode()[:16], "%Y-%m-%d %H:%M")
+        except (IndexError, ValueError):
+            return None
+    
+    
+    def load_watermarks(self):
+        """
+        
+        Load the per-ticker watermarks saved in file_path. Each holds the last 
+        Datetime and the byte offset in the ticker's csv file already read into
+        data, plus the header line, so that later loads read only the new tail
+        """
+        
+        mark_path = path.join(self.file_path, ".watermarks.json")
+        
+        if path.exists(mark_path):
+            with open(mark_path) as file:
+                self.watermarks = json.load(file)
+        else:
+            self.watermarks = {}
+        
+        return self.watermarks
+    
+    
+    def save_watermarks(self):
+        """Save the per-ticker watermarks to file_path"""
+        
+        mark_path = path.join(self.file_path, ".watermarks.json")
+        with open(mark_path, "w") as file:
+            json.dump(self.watermarks, file, indent=1)
+            
+        return
+    
+    
     def update_1m_28day(self, ticker, weeks=4, new_ticker=False):
-        """Use yfinance to download ticker data and write to csv file"""
+        """
         
-        data_path = path.join(self.file_path, ticker)
-        total_data = pd.DataFrame()
-        num_weeks = weeks + 1
+        Use yfinance to download ticker data and write to csv file. For an
+        existing ticker only the weeks since its last stored bar are downloaded
+        and only bars after it are appended, the file is never rewritten
+        """
+        
+        last, weeks = self._weeks_needed(ticker, weeks, new_ticker)
+        
+        frames = [self.downloader.download(ticker, start, end, interval="1m") 
+                  for start, end in self._windows(weeks)]
+        total_data = complete_bars(pd.concat(frames))
+        if len(total_data) == 0:
+            raise ValueError("no data returned")
+            
+        logger.info(f"{ticker} data downloaded from Yahoo Finance")
         
-        for n in range(1, num_weeks):
+        self._write_ticker(ticker, total_data, last, new_ticker)
+    
+        return
+    
+    
+    def _weeks_needed(self, ticker, weeks, new_ticker=False):
+        """
+        
+        Returns the ticker's last stored bar (None if unknown) and the number of
+        weeks, at most weeks, that have to be downloaded to reach it
+        """
+        
+        last = None
+        if new_ticker == False and self.store is None:
+            last = self._last_timestamp(path.join(self.file_path, f"{ticker}-1m.csv"))
+        if last is not None:
+            days_missing = (dt.date.today() - last.date()).days
+            weeks = max(1, min(weeks, days_missing // 7 + 1))
+            
+        return last, weeks
+    
+    
+    def _windows(self, weeks):
+        """(start, end) of the 7 day request windows covering the last weeks"""
+        
+        windows = []
+        for n in range(1, weeks + 1):
             start = dt.date.today() - dt.timedelta(weeks=n)
-            end = start + dt.timedelta(days=7)
-            data = yf.download(ticker, start, end, interval="1m")
-            data = data.drop(data.tail(1).index)
-            frames = [data, total_data]
-            total_data = pd.concat(frames)
-            
-        print(f"{ticker} data downloaded from Yahoo Finance")
-        
-        if new_ticker == False:
-            old_data = pd.read_csv(f"{data_path}-1m.csv", 
-                                   index_col="Datetime")
-            update_data = pd.concat([old_data, total_data])
-            update_data.to_csv(f"{data_path}-1m.csv")
-            print(f"{ticker} data written to csv file\n")
+            windows.append((start, start + dt.timedelta(days=7)))
+            
+        return windows
+    
+    
+    def _write_ticker(self, ticker, total_data, last=None, new_ticker=False):
+        """Write downloaded bars to the store or append them to the csv file"""
+        
+        data_path = path.join(self.file_path, ticker)
+        
+        if self.store is not None:
+            # only days not already in the store are written
+            self.store.append(ticker, total_data)
+            logger.info(f"{ticker} data written to store")
+        elif new_ticker == False:
+            # append bars after the last stored one in the file's column order
+            header = list(pd.read_csv(f"{data_path}-1m.csv", nrows=0).columns)
+            update_data = total_data[~total_data.index.duplicated()].sort_index()
+            update_data = update_data.reset_index()
+            update_data.rename(columns={update_data.columns[0]: header[0]}, 
+                               inplace=True)
+            
+            if last is not None:
+                stamps = parse_datetime(update_data[header[0]])
+                update_data = update_data[(stamps > last).values]
+            
+            update_data = update_data.reindex(columns=header)
+            update_data.to_csv(f"{data_path}-1m.csv", mode="a", header=False, 
+                               index=False)
+            logger.info(f"{ticker} data written to csv file")
         else:
             total_data.to_csv(f"{data_path}-1m.csv")
-            print(f"{ticker} data written to csv file\n")
+            logger.info(f"{ticker} data written to csv file")
     
         return
+    
+    
+    def _fix_header(self, ticker, file_list):
+        """Name the "Datetime" column commonly dropped by yfinance if unnamed"""
+        
+        if self.store is not None:
+            return
+        
+        data_path = path.join(self.file_path, file_list[ticker])
+        file_check = pd.read_csv(data_path, nrows=1)
+        
+        if "Datetime" not in file_check.columns:
+            file_check = pd.read_csv(data_path)
+            file_check.rename(columns={"Unnamed: 0":"Datetime"}, inplace=True)
+            file_check.to_csv(data_path, index=False)
+            
+        return
 
 
-    def download_ticker_data(self, weeks=4):
+    def _update_ticker(self, ticker, weeks, file_list):
+        """Update a single ticker, downloading the full 4 weeks if it is new"""
+        
+        if ticker in file_list.keys():
+            logger.info(f"Updating {ticker}")
+            self._fix_header(ticker, file_list)
+            self.update_1m_28day(ticker, weeks)
+           
+        else:
+            # if new ticker obtain the max allowed 4 weeks for 1m bars
+            logger.info(f"New: {ticker}")
+            self.update_1m_28day(ticker, 4, True)
+            
+        return
+    
+    
+    def _update_batch(self, tickers, weeks, file_list):
+        """
+        
+        Update a group of tickers with one multi-ticker request per 7 day 
+        window, covering the weeks the most out of date ticker needs (4 for a 
+        new ticker). Returns a dictionary of the tickers that failed to write.
+        """
+        
+        needed = {}
+        for ticker in tickers:
+            if ticker in file_list.keys():
+                self._fix_header(ticker, file_list)
+                needed[ticker] = self._weeks_needed(ticker, weeks)
+            else:
+                logger.info(f"New: {ticker}")
+                needed[ticker] = (None, 4)
+                
+        batch_weeks = max(ticker_weeks for _, ticker_weeks in needed.values())
+        
+        frames = {ticker: [] for ticker in tickers}
+        for start, end in self._windows(batch_weeks):
+            data = self.downloader.download(list(tickers), start, end, 
+                                            interval="1m", group_by="ticker")
+            for ticker, frame in split_tickers(data, tickers).items():
+                frames[ticker].append(frame)
+        
+        failed = {}
+        for ticker in tickers:
+            last, _ = needed[ticker]
+            total_data = complete_bars(pd.concat(frames[ticker]))
+            
+            try:
+                if len(total_data) == 0:
+                    raise ValueError("no data returned")
+                self._write_ticker(ticker, total_data, last, 
+                                   ticker not in file_list.keys())
+            except Exception as error:
+                failed[ticker] = error
+        
+        logger.info(f"{len(tickers) - len(failed)} of {len(tickers)} tickers "
+                    + "downloaded from Yahoo Finance and written")
+        if failed:
+            logger.info(f"{len(failed)} tickers of the batch failed: "
+                        + ", ".join(failed))
+                
+        return failed
+
+
+    def download_ticker_data(self, weeks=4, max_workers=1, batch_size=1):
         """
         
         Download a week's worth of 1m data at a time from Yahoo finance for up 
         to 4 weeks total and update to a csv file. If ticker is new then download
         full 4 weeks and write a new csv file to write_path.
         Assumed filenames of csv files is "TICK-1m.csv""
+        
+        Tickers are downloaded concurrently on max_workers threads, with requests
+        limited by self.downloader. A failed ticker does not stop the others and
+        failures are kept in self.failed_tickers.
+        
+        With batch_size above 1 each request fetches batch_size tickers at once,
+        dividing the number of requests by batch_size
         """
         
         if self.watchlist is None:
             self.watchlist = self.pop_watchlist()
-        
+            
         # obtain ticker and file names to include any existing
-        file_list = {file.name.split("-")[0]: file.name for file 
-                     in scandir(self.file_path) if file.is_file()}  
+        if self.store is not None:
+            file_list = {ticker: ticker for ticker in self.store.tickers()}
+        else:
+            file_list = {file.name.split("-")[0]: file.name 
+                         for file in self._csv_files()}  
         
-        for ticker in self.watchlist:
-            if ticker in file_list.keys():
-                print(ticker)
-                fname = file_list[ticker]
-                data_path = path.join(self.file_path, fname)
-                file_check = pd.read_csv(data_path, nrows=1)
-                
-                # check for "Datetime" column commonly dropped by yfinance and 
-                # replace if unnamed
-                if "Datetime" not in file_check.columns:
-                    file_check = pd.read_csv(data_path)
-                    file_check.rename(columns={"Unnamed: 0":"Datetime"}, 
-                                      inplace=True)
-                    file_check.to_csv(data_path, index=False)
-        
-                self.update_1m_28day(ticker, weeks)
-               
+        self.failed_tickers = {}
+        start = time.monotonic()
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            if batch_size > 1:
+                batches = [self.watchlist[i:i + batch_size] 
+                           for i in range(0, len(self.watchlist), batch_size)]
+                futures = {executor.submit(self._update_batch, batch, weeks, 
+                                           file_list): batch for batch in batches}
             else:
-                # if new ticker obtain the max allowed 4 weeks for 1m bars
-                print(f"New: {ticker}")
-                self.update_1m_28day(ticker, 4, True)
-               
-        print("All data downloaded")
+                futures = {executor.submit(self._update_ticker, ticker, weeks, 
+                                           file_list): [ticker] 
+                           for ticker in self.watchlist}
+            
+            for future in as_completed(futures):
+                try:
+                    failed = future.result() or {}
+                except Exception as error:
+                    failed = {ticker: error for ticker in futures[future]}
+                    
+                for ticker, error in failed.items():
+                    self.failed_tickers[ticker] = error
+                    logger.warning(f"{ticker} download failed: {error}")
+        
+        minutes = (time.monotonic() - start) / 60
+        num_done = len(self.watchlist) - len(self.failed_tickers)
+        self.metrics.count("tickers_downloaded", num_done)
+        self.metrics.count("tickers_failed", len(self.failed_tickers))
+        logger.info("All data downloaded")
+        logger.info(f"{num_done} tickers in {minutes:.2f} min "
+                    + f"({num_done / max(minutes, 1e-9):.1f} tickers/min), "
+                    + f"{len(self.failed_tickers)} failed")
         
         return
 
 
-    def pop_data_dict(self):
+    def pop_data_dict(self, columns=None, start_date=None, end_date=None, 
+                      lazy=False, max_bytes=None):
         """
         
         Open all relevant files and populate data dictionary with ticker dataframes
-        and change Datetime to real Timestamp object from string.
+        and change Datetime to real Timestamp object from string. When a store 
+        has been set only the given columns and date range are read from it.
+        
+        With lazy=True no files are read, data becomes a LazyData that reads 
+        each ticker between start_date and end_date on first access, keeping 
+        at most max_bytes of frames, and ticker_dates is found per ticker on 
+        first access too
         """
+        
+        if lazy:
+            if self.store is not None:
+                tickers = self.store.tickers()
+            else:
+                # file names found once rather than on every ticker load
+                self._file_names = {file.name.split("-")[0]: file.name 
+                                    for file in self._csv_files()}
+                tickers = list(self._file_names)
+            
+            self.data = LazyData(self._read_ticker, tickers, start_date, end_date, 
+                                 max_bytes)
+            self.ticker_dates = LazyTickerDates(self.data)
+            
+            return
     
         if self.data is None:
             self.data = {}
         if self.ticker_dates is None:
             self.ticker_dates = {}
             
+        if self.store is not None:
+            self._pop_data_from_store(columns, start_date, end_date)
+            return
+            
+        if self.watermarks is None:
+            self.load_watermarks()
+            
         # obtain new file list to include any new files/tickers
-        file_list = [file for file in scandir(self.file_path) if file.is_file()]
+        file_list = self._csv_files()
        
         for file in file_list:
             ticker = file.name.split("-")[0]
             new_data_path = path.join(self.file_path, file.name)
-            print(ticker)
+            logger.debug(ticker)
             
-            # determine the most recently updated data
-            if ticker in self.ticker_dates.keys():
-                recent_index = self.ticker_dates[ticker][-1][-1]
-            else:
-                recent_index = 0
+            mark = self._valid_watermark(ticker, new_data_path)
+            
+            # read from the watermark, or the whole file if there is none, 
+            # ignoring any partly written final line
+            with self.metrics.timer("read"):
+                with open(new_data_path, "rb") as file_in:
+                    header = file_in.readline()
+                    if mark is not None:
+                        file_in.seek(mark["offset"])
+                    body = file_in.read()
+                    body = body[:body.rfind(b"\n") + 1]
+                
+                offset = (len(header) if mark is None else mark["offset"]) + len(body)
+                names = [name if name else "Unnamed: 0" 
+                         for name in header.decode().strip().split(",")]
+                
+                if body.strip():
+                    new_data = pd.read_csv(io.BytesIO(body), header=None, names=names, 
+                                           dtype=csv_dtypes(names), 
+                                           usecols=lambda name: name not in DROP_COLUMNS)
+                else:
+                    new_data = pd.DataFrame(columns=names)
+            
+            with self.metrics.timer("parse"):
+                new_data = apply_schema(new_data)
+            self.metrics.count("tickers")
+            self.metrics.count("rows", len(new_data))
+            
+            if mark is None:
+                # determine the most recently updated data
+                if ticker in self.ticker_dates.keys():
+                    recent_index = self.ticker_dates[ticker][-1][-1]
+                else:
+                    recent_index = 0
                 
-            new_data = pd.read_csv(new_data_path)
-            new_data = new_data[recent_index:]
+                new_data = new_data[recent_index:]
             
             if len(new_data) < 2:
                 pass
@@ -156,33 +878,156 @@ class FinDataExtract:
                         new_data.rename(columns={"Unnamed: 0": "Datetime"}, 
                                         inplace=True)
                         
-                    # convert datetime strings to proper datetime objects
-                    new_data["Datetime"] = new_data["Datetime"].apply(
-                                           lambda x: dt.datetime.strptime(
-                                                       x[:16], "%Y-%m-%d %H:%M")
-                                           )
+                    with self.metrics.timer("parse"):
+                        # convert datetime strings to a native datetime64 column
+                        new_data["Datetime"] = parse_datetime(new_data["Datetime"])
+                        
+                        # data from older pickles holds float64 prices and Python 
+                        # datetime objects
+                        self.data[ticker] = apply_schema(self.data[ticker])
                     
-                    new_data = new_data.sort_values(by="Datetime", ignore_index=True)
-                    new_data = new_data.drop_duplicates(subset=["Datetime"], keep="first")
-                    new_data = new_data.reset_index(drop=True)
-                    self.data[ticker] = pd.concat([self.data[ticker], new_data])
+                    with self.metrics.timer("dedupe"):
+                        new_data = new_data.sort_values(by="Datetime", ignore_index=True)
+                        new_data = new_data.drop_duplicates(subset=["Datetime"], 
+                                                            keep="first")
+                        
+                        # bars already loaded may be repeated in the file
+                        new_data = new_data[new_data["Datetime"] 
+                                            > self.data[ticker]["Datetime"].iloc[-1]]
+                        new_data = new_data.reset_index(drop=True)
+                        self.data[ticker] = pd.concat([self.data[ticker], new_data],
+                                                      ignore_index=True)
                 
                 else:
-                    if "Datetime" not in new_data.columns:
-                        new_data.rename(columns={"Unnamed: 0": "Datetime"}, inplace=True)
-                    
-                    # convert datetime strings to proper datetime objects
-                    new_data["Datetime"] = new_data["Datetime"].apply(
-                                           lambda x: dt.datetime.strptime(
-                                                       x[:16], "%Y-%m-%d %H:%M")
-                                           )
-                    
-                    new_data = new_data.sort_values(by="Datetime", ignore_index=True)
-                    new_data = new_data.drop_duplicates(subset=["Datetime"], keep="first")
-                    new_data = new_data.reset_index(drop=True)
-                    self.data[ticker] = new_data
+                    self.data[ticker] = self._clean_frame(new_data)
+                
+                self.watermarks[ticker] = {
+                    "last": str(self.data[ticker]["Datetime"].iloc[-1])[:16],
+                    "offset": offset,
+                    "header": header.decode().strip()}
+        
+        self.save_watermarks()
             
         return
+    
+    
+    def _clean_frame(self, new_data):
+        """Name and parse the Datetime column, then sort and drop duplicate bars"""
+        
+        if "Datetime" not in new_data.columns:
+            new_data.rename(columns={"Unnamed: 0": "Datetime"}, inplace=True)
+        
+        # convert datetime strings to a native datetime64 column
+        with self.metrics.timer("parse"):
+            new_data["Datetime"] = parse_datetime(new_data["Datetime"])
+        
+        with self.metrics.timer("dedupe"):
+            num_rows = len(new_data)
+            new_data = new_data.sort_values(by="Datetime", ignore_index=True)
+            new_data = new_data.drop_duplicates(subset=["Datetime"], keep="first")
+            new_data = new_data.reset_index(drop=True)
+        self.metrics.count("duplicates_dropped", num_rows - len(new_data))
+        
+        return new_data
+    
+    
+    def _read_ticker(self, ticker, start_date=None, end_date=None):
+        """
+        
+        Read one ticker from the store or its csv file, keeping only the days 
+        between start_date and end_date ("YYYY-MM-DD") inclusive
+        """
+        
+        self.metrics.count("lazy_loads")
+        
+        if self.store is not None:
+            with self.metrics.timer("read"):
+                new_data = self.store.read(ticker, start_date=start_date, 
+                                           end_date=end_date)
+            with self.metrics.timer("parse"):
+                return apply_schema(new_data)
+        
+        if ticker not in self._file_names:
+            self._file_names = {file.name.split("-")[0]: file.name 
+                                for file in self._csv_files()}
+        data_path = path.join(self.file_path, self._file_names[ticker])
+        with self.metrics.timer("read"):
+            names = list(pd.read_csv(data_path, nrows=0).columns)
+            new_data = pd.read_csv(data_path, dtype=csv_dtypes(names), 
+                                   usecols=lambda name: name not in DROP_COLUMNS)
+        with self.metrics.timer("parse"):
+            new_data = apply_schema(new_data)
+        new_data = self._clean_frame(new_data)
+        
+        days = new_data["Datetime"].dt.normalize()
+        if start_date is not None:
+            new_data = new_data[days >= pd.Timestamp(start_date)]
+            days = days[days >= pd.Timestamp(start_date)]
+        if end_date is not None:
+            new_data = new_data[days <= pd.Timestamp(end_date)]
+        
+        return new_data.reset_index(drop=True)
+    
+    
+    def _valid_watermark(self, ticker, data_path):
+        """
+        
+        Returns the ticker's watermark if it still describes both the data in 
+        memory and the csv file on disk, otherwise None
+        """
+        
+        mark = self.watermarks.get(ticker)
+        if mark is None or self.data.get(ticker) is None or len(self.data[ticker]) == 0:
+            return None
+        if str(self.data[ticker]["Datetime"].iloc[-1])[:16] != mark["last"]:
+            return None
+        
+        with open(data_path, "rb") as file:
+            header = file.readline().decode().strip()
+            file.seek(0, 2)
+            size = file.tell()
+        
+        if header != mark["header"] or size < mark["offset"]:
+            return None
+        
+        return mark
+
+
+    def _pop_data_from_store(self, columns=None, start_date=None, end_date=None):
+        """Populate data dictionary from self.store reading only new days"""
+        
+        for ticker in self.store.tickers():
+            logger.debug(ticker)
+            ticker_start = start_date
+            loaded = None
+            
+            # only read from the most recent day already loaded, which is read
+            # again as it may have been partly written, keeping the bars after
+            # the last one loaded
+            if ticker in self.data.keys() and ticker in self.ticker_dates.keys() \
+               and len(self.data[ticker]) > 0:
+                month, day, year = self.ticker_dates[ticker][-1][:3]
+                ticker_start = dt.date(year, month, day)
+                loaded = self.data[ticker]["Datetime"].iloc[-1]
+                
+            with self.metrics.timer("read"):
+                new_data = self.store.read(ticker, columns, ticker_start, end_date)
+                if loaded is not None and len(new_data) > 0:
+                    new_data = new_data[new_data["Datetime"] > loaded]
+            with self.metrics.timer("parse"):
+                new_data = apply_schema(new_data)
+            self.metrics.count("tickers")
+            self.metrics.count("rows", len(new_data))
+            
+            if len(new_data) < (1 if loaded is not None else 2):
+                pass
+            elif ticker in self.data.keys():
+                self.data[ticker] = pd.concat([self.data[ticker], new_data], 
+                                              ignore_index=True)
+            else:
+                self.data[ticker] = new_data
+        
+        return
 
 
     def pop_ticker_dates(self):
@@ -195,23 +1040,26 @@ class FinDataExtract:
         """
         
         if self.data is None:
-            print("\nNo data supplied: please pass a dictionary of dataframes "
-                  + "as an argument or use the pop_data_dict() function")
+            logger.warning("No data supplied: please pass a dictionary of dataframes "
+                           + "as an argument or use the pop_data_dict() function")
             return
         
         if self.ticker_dates is None:
             self.ticker_dates = {}
             
         # obtain new file list to include any new files/tickers
-        file_list = [file for file in scandir(self.file_path) if file.is_file()]
+        if self.store is not None:
+            tickers = self.store.tickers()
+        else:
+            tickers = [file.name.split("-")[0] for file in self._csv_files()]
         
-        for file in file_list:
-            ticker = file.name.split("-")[0]
-            print(ticker)
+        for ticker in tickers:
+            logger.debug(ticker)
             
-            # determine the most recently updated data
-            if ticker in self.ticker_dates.keys():
-                recent_index = self.ticker_dates[ticker][-1][-1]
+            # re-index from the open of the last indexed day, which may have 
+            # been only partly downloaded when it was indexed
+            if ticker in self.ticker_dates.keys() and len(self.ticker_dates[ticker]) > 0:
+                recent_index = self.ticker_dates[ticker][-1][3]
             else:
                 recent_index = 0
     
@@ -220,34 +1068,18 @@ class FinDataExtract:
             if len(new_data) < 2:
                 pass
             else:
-                begin_index = new_data.index[0]
-                end_index = new_data.index[-1]
-                dates = []
-                month = new_data["Datetime"][begin_index].month
-                day = new_data["Datetime"][begin_index].day
-                year = new_data["Datetime"][begin_index].year
-                start = begin_index
-                num_days = 0
-                dates.append([month, day, year, start])
-                
-                # iterate through dataframe and separate into different days
-                for i in range(begin_index+1, end_index):
-                    if new_data["Datetime"][i].date() != new_data["Datetime"][i-1].date():
-                        start = i
-                        month = new_data["Datetime"][i].month
-                        day = new_data["Datetime"][i].day
-                        year = new_data["Datetime"][i].year
-                        dates.append([month, day, year, start])
-                        dates[num_days].append(i)
-                        num_days += 1
-            
-                # adding final index value for final day
-                dates[-1].append(end_index+1)
+                with self.metrics.timer("index"):
+                    dates = find_ticker_dates(new_data)
+                self.metrics.count("days_indexed", len(dates))
                 
                 if ticker in self.ticker_dates.keys():
+                    if not isinstance(self.ticker_dates[ticker], TickerDates):
+                        self.ticker_dates[ticker] = TickerDates(self.ticker_dates[ticker])
+                    if len(self.ticker_dates[ticker]) > 0:
+                        self.ticker_dates[ticker].pop()
                     self.ticker_dates[ticker].extend(dates)
                 else:
-                    self.ticker_dates[ticker] = dates 
+                    self.ticker_dates[ticker] = TickerDates(dates)
         
         return
     
@@ -258,7 +1090,7 @@ class FinDataExtract:
         if ticker is None:
             ticker = list(self.data.keys())[0]
         if ticker not in self.data.keys():
-            print(f"{ticker} not found in data")
+            logger.warning(f"{ticker} not found in data")
             return None
     
         if start_date is None:
@@ -266,18 +1098,18 @@ class FinDataExtract:
         else:
             start = start_date.split("-")
             start_list = [int(start[1]), int(start[2]), int(start[0])]   
-            start_index = [x[3] for x in self.ticker_dates[ticker] if x[:3] == start_list][0]
+            start_index = self.ticker_dates[ticker].open_close(start_list)[0]
         
         if end_date is None:
             end_index = self.ticker_dates[ticker][-1][4]
         else:
             end = end_date.split("-")
             end_list = [int(end[1]), int(end[2]), int(end[0])]
-            end_index = [x[4] for x in self.ticker_dates[ticker] if x[:3] == end_list][0]
+            end_index = self.ticker_dates[ticker].open_close(end_list)[1]
         
         temp = self.data[ticker][start_index:end_index]
         temp = temp.reset_index(drop=True)
-        print(f"Data slice for {ticker}")
+        logger.info(f"Data slice for {ticker}")
         
         return temp
 
@@ -288,7 +1120,7 @@ class FinDataExtract:
         if ticker is None:
             ticker = list(self.data.keys())[0]
         if ticker not in self.data.keys():
-            print(f"{ticker} not found in data")
+            logger.warning(f"{ticker} not found in data")
             return None
         
         plot_data = self.slice_data(ticker, start_date, end_date)
@@ -300,7 +1132,7 @@ class FinDataExtract:
         else:
             plt.ylabel("Stock Price (USD)")
         plt.legend()
-        print(f"{plot_series}-data plotted for {ticker}")
+        logger.info(f"{plot_series}-data plotted for {ticker}")
         
         return
     
@@ -325,74 +1157,186 @@ class FinDataExtract:
     
 
     def downcast_data(self, data=None):
-        """Function to lower memory usage by changing from float64 to float 32"""
+        """
+        
+        Function to lower memory usage of data loaded before the ingest schema, 
+        converting to float32 prices and uint32 volume and dropping Adj Close
+        """
 
         if data is None:
             data = self.data
             
-        cols = ["Open", "High", "Low", "Close", "Adj Close"]
-        for ticker in data.keys():
-            for column in cols:
-                data[ticker][column] = data[ticker][column].astype("float32")
+        for ticker in list(data.keys()):
+            data[ticker] = apply_schema(data[ticker])
         
         return
+    
+    
+    def memory_report(self, data=None):
+        """
+        
+        Returns a dataframe of rows and bytes held per ticker, deep counting 
+        any object columns, with a final Total row
+        """
+        
+        if data is None:
+            data = self.data
+        
+        # only count tickers a LazyData already holds in memory
+        tickers = data.loaded() if isinstance(data, LazyData) else list(data.keys())
+        
+        report = pd.DataFrame({
+            "Rows": [len(data[ticker]) for ticker in tickers],
+            "Bytes": [int(data[ticker].memory_usage(deep=True).sum()) 
+                      for ticker in tickers]}, 
+            index=pd.Index(tickers, name="Ticker"))
+        report.loc["Total"] = report.sum()
+        report["MB"] = report["Bytes"] / 2**20
+        
+        return report
 
 
+    def _raw_bars(self, ticker):
+        """Datetime and Volume of a ticker's csv file in the order they were written"""
+        
+        fname = [file.name for file in self._csv_files() 
+                 if file.name.split("-")[0] == ticker][0]
+        new_data = pd.read_csv(path.join(self.file_path, fname), 
+                               usecols=lambda name: name in ["Datetime", "Unnamed: 0", 
+                                                             "Volume"])
+        new_data.rename(columns={"Unnamed: 0": "Datetime"}, inplace=True)
+        
+        return (parse_datetime(new_data["Datetime"]).values, 
+                new_data["Volume"].fillna(0).to_numpy())
+    
+    
+    def scan_quality(self, start_date=None, end_date=None, raw=False, 
+                     issues_only=True):
+        """
+        
+        Vectorized data quality scan of every ticker against the exchange 
+        calendar between start_date and end_date ("YYYY-MM-DD", by default the 
+        first and last day with data). Returns one table with a row per 
+        ticker-day, see scan_bars for the columns, holding only days with an 
+        issue unless issues_only is False. With raw=True the csv files are 
+        scanned as written rather than the cleaned data in memory, so that 
+        duplicate and out of order bars from the download can be seen.
+        """
+        
+        if raw:
+            tickers = [file.name.split("-")[0] for file in self._csv_files()]
+            bars = {ticker: self._raw_bars(ticker) for ticker in tickers}
+        else:
+            bars = {ticker: (self.data[ticker]["Datetime"].values, 
+                             self.data[ticker]["Volume"].to_numpy()) 
+                    for ticker in self.data.keys()}
+        
+        day_bounds = [(stamps.min(), stamps.max()) for stamps, _ in bars.values() 
+                      if len(stamps) > 0]
+        if len(day_bounds) == 0:
+            return pd.DataFrame(columns=["Ticker", "Date", "Expected", "Bars", 
+                                         "Missing", "Duplicates", "OutOfOrder", 
+                                         "OffSession", "ZeroVolume", "ZeroVolumeRun"])
+        
+        start = np.datetime64(start_date if start_date is not None 
+                              else min(bound[0] for bound in day_bounds), "D")
+        end = np.datetime64(end_date if end_date is not None 
+                            else max(bound[1] for bound in day_bounds), "D")
+        days, minutes = self.calendar.sessions(start, end)
+        
+        tables = []
+        for ticker, (stamps, volume) in bars.items():
+            stamp_days = stamps.astype("datetime64[D]")
+            in_range = (stamp_days >= start) & (stamp_days <= end)
+            with self.metrics.timer("verify"):
+                table = pd.DataFrame(scan_bars(stamps[in_range], volume[in_range], 
+                                               days, minutes))
+            table = table.sort_values(by="Date", kind="stable")
+            table.insert(0, "Ticker", ticker)
+            tables.append(table)
+        
+        report = pd.concat(tables, ignore_index=True)
+        report["Ticker"] = report["Ticker"].astype("category")
+        
+        if issues_only:
+            issues = report[["Missing", "Duplicates", "OutOfOrder", "OffSession", 
+                             "ZeroVolume"]].any(axis=1) | (report["Expected"] == 0)
+            report = report[issues].reset_index(drop=True)
+        
+        return report
+        
+    
     def verify_data(self, start_date=None, end_date=None, minute_check=False):
         """
         
         Function accepts start and end dates for which to check the downloaded data
-        versus the days that the market is open (weekdays) and returns a dictionary 
-        of tickers and corresponding lists of missing days of data plus a dictionary
-        of tickers and corresponding list of tuples of dates and number of missing
-        minutes of data for those dates if minute_check flag is set to True
+        versus the days that the market is open (exchange calendar) and returns a 
+        dictionary of tickers and corresponding lists of missing days of data, or 
+        days with data the market was closed, plus a dictionary of tickers and 
+        corresponding list of tuples of dates and number of missing minutes of 
+        data for those dates if minute_check flag is set to True
         """
         
         if start_date is None:
-            start = self.data[list(self.data.keys())[0]]["Datetime"][0].date()
-        else:
-            start = dt.datetime.strptime(start_date, "%Y-%m-%d").date()
-    
+            start_date = self.data[list(self.data.keys())[0]]["Datetime"].iloc[0]
         if end_date is None:
-            end = self.data[list(self.data.keys())[0]]["Datetime"].iloc[-1].date()
-        else:
-            end = dt.datetime.strptime(end_date, "%Y-%m-%d").date()
-        
-        # Not true market days, only a list of weekdays in the date range
-        market_days = []
+            end_date = self.data[list(self.data.keys())[0]]["Datetime"].iloc[-1]
         
-        for x in range((end - start).days+1):    
-            next_day = start + dt.timedelta(days=x)
-            if next_day.isoweekday() < 6:
-                market_days.append(next_day)
+        report = self.scan_quality(start_date, end_date)
+        dates = report["Date"].dt.date
+        missed = (report["Bars"] == 0) | (report["Expected"] == 0)
+        short = ~missed & (report["Missing"] > 0)
         
         missed_days_ticker = {}
         missed_mins_ticker = {}
-    
-        for ticker in self.data.keys():
-            missed_days = []
-            missing_minutes = []
-    
-            day_open = {self.data[ticker]["Datetime"][i[3]].date():i for i in self.ticker_dates[ticker]}
-            
-            missed_days = list(set(market_days) ^ set(day_open.keys()))
-            
-            if minute_check == True:
-                for date, day in day_open.items():
-                    len_day_slice = len(self.data[ticker][day[3]:day[4]])
-                    if len_day_slice < 389:
-                        missing_minutes.append((date, 389-len_day_slice))
-                
-                missed_mins_ticker[ticker] = missing_minutes
+        
+        for ticker, rows in report[missed].groupby("Ticker", observed=True).groups.items():
+            missed_days_ticker[ticker] = dates[rows].tolist()
             
-            if len(missed_days) > 0:
-                missed_days_ticker[ticker] = missed_days
-            if len(missing_minutes) > 0:
-                missed_mins_ticker[ticker] = missing_minutes
+        if minute_check == True:
+            missed_mins_ticker = {ticker: [] for ticker in self.data.keys()}
+            for ticker, rows in report[short].groupby("Ticker", observed=True).groups.items():
+                missed_mins_ticker[ticker] = list(zip(dates[rows].tolist(), 
+                                                      report["Missing"][rows].tolist()))
 
         return missed_days_ticker, missed_mins_ticker
 
 
+    def publish_cache(self, name, registry=None):
+        """
+        
+        Publish data and ticker_dates in shared memory as name for other 
+        processes to attach to, recording the files in file_path (or the 
+        store) so that they can tell when it is out of date. Returns the 
+        SharedCache, which keeps the data published until it is closed or 
+        this process ends
+        """
+        
+        from findata_cache import SharedCache
+        
+        source = self.store.root if self.store is not None else self.file_path
+        
+        return SharedCache.publish(name, self.data, self.ticker_dates, source, 
+                                   registry)
+    
+    
+    def attach_cache(self, name, registry=None, check=True):
+        """
+        
+        Use the shared memory cache published as name for data and 
+        ticker_dates without loading or copying anything. Raises 
+        StaleCacheError if check is True and its files have since changed
+        """
+        
+        from findata_cache import SharedCache
+        
+        cache = SharedCache.attach(name, registry, check)
+        self.data = cache
+        self.ticker_dates = cache.ticker_dates
+        
+        return cache
+    
+    
     def load_pickles(self, pickle_path, data_name, ticker_dates_name):
         """load and return pickle files of previously stored data and ticker_dates"""
         
@@ -404,8 +1348,12 @@ class FinDataExtract:
         file_in = open(dates_in, "rb")
         ticker_dates = pickle.load(file_in)
         
+        # older pickles hold float64 prices and Python datetime objects
+        for ticker in list(data.keys()):
+            data[ticker] = apply_schema(data[ticker])
+        
         self.data = data
-        self.ticker_dates = ticker_dates
+        self.ticker_dates = as_ticker_dates(ticker_dates)
         
         return
     
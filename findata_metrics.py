@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+
+Instrumentation shared by FinDataExtract and PackCorrelation: stage timers,
+counters and optional cProfile/tracemalloc capture, plus the "findata"
+loggers that report progress.
+
+@author: Leo
+"""
+
+import cProfile
+import io
+import json
+import logging
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger("findata")
+
+
+def enable_logging(level=logging.INFO, handler=None):
+    """
+
+    Show findata progress messages at level or above on stderr, or through
+    handler. Messages are silent until this is called (warnings excepted)
+    """
+
+    if handler is None:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+
+    logger.addHandler(handler)
+    logger.setLevel(level)
+
+    return handler
+
+
+def disable_logging():
+    """Silence all findata messages, warnings included"""
+
+    logger.setLevel(logging.CRITICAL + 1)
+
+    return
+
+
+class Metrics:
+    """
+
+    Stage timers and counters. Nothing is recorded unless enabled, so timers
+    cost next to nothing when instrumentation is off. One Metrics can be
+    shared by a FinDataExtract and a PackCorrelation to measure a whole run.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.timers = {}
+        self.counters = {}
+        self.profile_stats = None
+        self.memory = None
+
+    def __repr__(self):
+        state = "enabled" if self.enabled else "disabled"
+        return f"Metrics ({state}) of {len(self.timers)} stages " \
+               + f"and {len(self.counters)} counters"
+
+    def reset(self):
+        self.timers = {}
+        self.counters = {}
+        self.profile_stats = None
+        self.memory = None
+
+    def timer(self, stage):
+        """Context manager adding the time spent inside it to stage"""
+
+        if not self.enabled:
+            return nullcontext()
+
+        return self._timer(stage)
+
+    @contextmanager
+    def _timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timer = self.timers.setdefault(stage, {"seconds": 0.0, "calls": 0})
+            timer["seconds"] += time.perf_counter() - start
+            timer["calls"] += 1
+
+    def count(self, name, value=1):
+        """Add value to the counter name"""
+
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def profile(self, memory=False, sort="cumulative", limit=30):
+        """
+
+        Run the enclosed code under cProfile, keeping the top limit functions
+        by sort in profile_stats, and with memory=True under tracemalloc,
+        keeping current and peak traced bytes and the top allocation sites
+        """
+
+        profiler = cProfile.Profile()
+        if memory:
+            tracemalloc.start()
+        profiler.enable()
+        try:
+            yield self
+        finally:
+            profiler.disable()
+            text = io.StringIO()
+            pstats.Stats(profiler, stream=text).sort_stats(sort).print_stats(limit)
+            self.profile_stats = text.getvalue()
+
+            if memory:
+                current, peak = tracemalloc.get_traced_memory()
+                top = tracemalloc.take_snapshot().statistics("lineno")[:limit]
+                tracemalloc.stop()
+                self.memory = {"current_bytes": current, "peak_bytes": peak,
+                               "top": [str(stat) for stat in top]}
+
+    def merge(self, metrics):
+        """
+        
+        Add the timers and counters of another Metrics' to_dict(), such as one
+        returned by a worker process. Timers then sum the time of all workers
+        """
+        
+        if not self.enabled:
+            return
+        
+        for stage, other in metrics["timers"].items():
+            timer = self.timers.setdefault(stage, {"seconds": 0.0, "calls": 0})
+            timer["seconds"] += other["seconds"]
+            timer["calls"] += other["calls"]
+        for name, value in metrics["counters"].items():
+            self.count(name, value)
+
+    def to_dict(self):
+        return {"timers": {stage: dict(timer) for stage, timer in self.timers.items()},
+                "counters": dict(self.counters),
+                "profile": self.profile_stats, "memory": self.memory}
+
+    def to_json(self, json_path=None):
+        """Returns the metrics as JSON, also writing them to json_path if given"""
+
+        text = json.dumps(self.to_dict(), indent=2)
+        if json_path is not None:
+            with open(json_path, "w") as file:
+                file.write(text)
+
+        return text
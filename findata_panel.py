@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+
+Memory-mapped panel format for 1m bars so that a whole watchlist can be
+opened without deserializing or copying it.
+
+@author: Leo
+"""
+
+from os import makedirs, path
+import datetime as dt
+import json
+import numpy as np
+import pandas as pd
+from findata_extraction import TickerDates, parse_datetime
+from findata_calendar import MARKET_OPEN, DAY_MINUTES
+
+
+def day_bounds(close):
+    """
+
+    Returns an int16 (tickers x days x 2) array of the first and one past the
+    last minute of each day with a Close for each row of a panel's Close
+    array, -1 for days without bars
+    """
+
+    num_days = close.shape[1] // DAY_MINUTES
+    bounds = np.full((close.shape[0], num_days, 2), -1, dtype="int16")
+    for row in range(close.shape[0]):
+        valid = ~np.isnan(close[row]).reshape(-1, DAY_MINUTES)
+        traded = valid.any(axis=1)
+        bounds[row, traded, 0] = valid[traded].argmax(axis=1)
+        bounds[row, traded, 1] = DAY_MINUTES - valid[traded, ::-1].argmax(axis=1)
+
+    return bounds
+
+
+class Panel:
+    """
+
+    Holds one contiguous (tickers x minutes) float32 array per OHLCV field on
+    a shared grid of 390 minute slots for every trading day, with NaN where a
+    ticker has no bar. Day d of the panel occupies columns d*390 to
+    (d+1)*390. Arrays are opened with np.memmap so several processes reading
+    the same panel share one page-cached copy.
+
+    Behaves like the usual data dictionary (keys, len, in, [ticker]) and
+    provides ticker_dates, so it can be passed straight to PackCorrelation.
+    As ticker_dates spans the grid, a day's open to close includes the NaN of
+    missing minutes, which PackCorrelation drops when aligning by position.
+    """
+
+    fields = ["Open", "High", "Low", "Close", "Volume"]
+
+    # grid of bars with NaN for missing minutes
+    grid = True
+
+    def __init__(self, panel_path, mode="r"):
+        self.panel_path = panel_path
+
+        with open(path.join(panel_path, "panel.json")) as file:
+            meta = json.load(file)
+
+        self.tickers = meta["tickers"]
+        self.days = [dt.date.fromisoformat(day) for day in meta["days"]]
+        self._rows = {ticker: row for row, ticker in enumerate(self.tickers)}
+        shape = (len(self.tickers), len(self.days) * DAY_MINUTES)
+
+        self.arrays = {field: np.memmap(path.join(panel_path, f"{field}.dat"),
+                                        dtype=meta["dtype"], mode=mode, shape=shape)
+                       for field in self.fields}
+
+        # minute since the epoch of every column in the grid
+        day_starts = np.array(self.days, dtype="datetime64[D]") \
+                     .astype("datetime64[m]").astype("int64")
+        self.minutes = (day_starts[:, None] + MARKET_OPEN
+                        + np.arange(DAY_MINUTES)).ravel()
+
+        bounds_path = path.join(panel_path, "ticker_dates.npy")
+        if path.exists(bounds_path):
+            self.ticker_dates = self._load_ticker_dates(np.load(bounds_path))
+        else:
+            # panels written before the day bounds were saved
+            self.ticker_dates = self._load_ticker_dates(day_bounds(self.arrays["Close"]))
+
+    def __repr__(self):
+        return f"Panel of {len(self.tickers)} tickers and {len(self.days)} days"
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __iter__(self):
+        return iter(self.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self._rows
+
+    def keys(self):
+        return list(self.tickers)
+
+    def __getitem__(self, ticker):
+        """Returns a dataframe of the full minute grid for ticker (a copy)"""
+
+        row = self._rows[ticker]
+        frame = pd.DataFrame({"Datetime": self.minutes.astype("datetime64[m]")
+                                                      .astype("datetime64[ns]")})
+        for field in self.fields:
+            frame[field] = np.asarray(self.arrays[field][row])
+
+        return frame
+
+    def ticker_arrays(self, ticker):
+        """Returns zero-copy views of a ticker's Open and Close rows"""
+
+        row = self._rows[ticker]
+
+        return {"Open": self.arrays["Open"][row],
+                "Close": self.arrays["Close"][row],
+                "Minute": self.minutes}
+
+    def _load_ticker_dates(self, bounds):
+        """
+
+        Builds ticker_dates from day_bounds, with each day's open and close
+        indices pointing at the first and one past the last minute with a Close
+        """
+
+        months = np.array([day.month for day in self.days])
+        days = np.array([day.day for day in self.days])
+        years = np.array([day.year for day in self.days])
+        day_starts = np.arange(len(self.days)) * DAY_MINUTES
+
+        ticker_dates = {}
+        for ticker, row in self._rows.items():
+            traded = np.flatnonzero(bounds[row, :, 0] >= 0)
+            entries = np.column_stack((months[traded], days[traded], years[traded],
+                                       day_starts[traded] + bounds[row, traded, 0],
+                                       day_starts[traded] + bounds[row, traded, 1]))
+            ticker_dates[ticker] = TickerDates(entries.tolist())
+
+        return ticker_dates
+
+    @classmethod
+    def write(cls, panel_path, data, dtype="float32"):
+        """
+
+        Writes a dictionary of ticker dataframes to panel_path as a panel and
+        returns it opened read-only. Bars outside 09:30-16:00 are dropped. The
+        day bounds of ticker_dates are saved with it so opening the panel does
+        not scan the Close array.
+        """
+
+        makedirs(panel_path, exist_ok=True)
+        tickers = sorted(data.keys())
+
+        # grid minutes and day numbers of every bar of every ticker
+        stamps = {}
+        day_set = set()
+        for ticker in tickers:
+            minutes = parse_datetime(data[ticker]["Datetime"]).values \
+                      .astype("datetime64[m]").astype("int64")
+            stamps[ticker] = minutes
+            day_set.update(np.unique(minutes // 1440).tolist())
+
+        day_nums = np.array(sorted(day_set), dtype="int64")
+        days = [str(day) for day in day_nums.astype("datetime64[D]")]
+        shape = (len(tickers), len(days) * DAY_MINUTES)
+
+        meta = {"tickers": tickers, "days": days, "dtype": dtype}
+        with open(path.join(panel_path, "panel.json"), "w") as file:
+            json.dump(meta, file)
+
+        for field in cls.fields:
+            array = np.memmap(path.join(panel_path, f"{field}.dat"),
+                              dtype=dtype, mode="w+", shape=shape)
+            array[:] = np.nan
+
+            for row, ticker in enumerate(tickers):
+                minutes = stamps[ticker]
+                offsets = minutes % 1440 - MARKET_OPEN
+                in_session = (offsets >= 0) & (offsets < DAY_MINUTES)
+                columns = np.searchsorted(day_nums, minutes // 1440) * DAY_MINUTES \
+                          + offsets
+                values = data[ticker][field].to_numpy(dtype=dtype)
+                array[row, columns[in_session]] = values[in_session]
+
+            if field == "Close":
+                np.save(path.join(panel_path, "ticker_dates.npy"), day_bounds(array))
+
+            array.flush()
+            del array
+
+        return cls(panel_path)
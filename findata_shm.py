@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+
+Shared memory helpers so that worker processes can read price arrays without
+receiving pickled copies of the data dictionary.
+
+@author: Leo
+"""
+
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+
+
+def attach_shared_memory(name):
+    """
+
+    Attach to an existing shared memory block without registering it with
+    this process's resource tracker, which would otherwise unlink the block
+    when an attaching worker exits
+    """
+
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before Python 3.13 attaching always registers the block, skip that
+        # rather than unregistering afterwards, which would also drop the
+        # creator's registration when the tracker is shared with a pool worker
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedArrays:
+    """
+
+    Packs a dictionary of (ticker, field) -> 1-D array into one shared memory
+    block. spec() is a small picklable description that other processes pass
+    to SharedArrays.attach to get read-only views of the same memory.
+    """
+
+    def __init__(self, shm, layout, owner=False):
+        self.shm = shm
+        self.layout = layout
+        self.owner = owner
+        self.arrays = {}
+
+        for key, (offset, length, dtype) in layout.items():
+            array = np.ndarray((length,), dtype=dtype, buffer=shm.buf, offset=offset)
+            array.flags.writeable = False
+            self.arrays[key] = array
+
+        self._tickers = {}
+        for (ticker, field), array in self.arrays.items():
+            self._tickers.setdefault(ticker, {})[field] = array
+
+    def __repr__(self):
+        return f"SharedArrays {self.shm.name} of {len(self._tickers)} tickers"
+
+    def __len__(self):
+        return len(self._tickers)
+
+    def __iter__(self):
+        return iter(self._tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self._tickers
+
+    def keys(self):
+        return list(self._tickers)
+
+    def ticker_arrays(self, ticker):
+        """Returns the read-only arrays for ticker keyed by field"""
+
+        return self._tickers[ticker]
+
+    @classmethod
+    def create(cls, arrays, name=None):
+        """Copies a dictionary of (ticker, field) -> array into shared memory"""
+
+        layout = {}
+        offset = 0
+        for key, array in arrays.items():
+            array = np.asarray(array)
+            layout[key] = (offset, len(array), array.dtype.str)
+            # keep every array 8 byte aligned
+            offset += -(-array.nbytes // 8) * 8
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=max(offset, 8))
+        for key, array in arrays.items():
+            start, length, dtype = layout[key]
+            np.ndarray((length,), dtype=dtype, buffer=shm.buf, offset=start)[:] = array
+
+        return cls(shm, layout, owner=True)
+
+    def spec(self):
+        return self.shm.name, self.layout
+
+    @classmethod
+    def attach(cls, spec):
+        name, layout = spec
+
+        return cls(attach_shared_memory(name), layout)
+
+    def close(self):
+        """Release the views and detach, unlinking the block if this created it"""
+
+        self.arrays = {}
+        self._tickers = {}
+        try:
+            self.shm.close()
+        except BufferError:
+            # views are still held elsewhere, the mapping goes with them
+            pass
+        if self.owner:
+            self.shm.unlink()
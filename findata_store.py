@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+
+Columnar on-disk storage of 1m bars as an alternative to one csv file per
+ticker. Requires pyarrow (or fastparquet) for pandas Parquet support.
+
+@author: Leo
+"""
+
+from os import scandir, makedirs, path
+import datetime as dt
+import logging
+import pandas as pd
+from findata_extraction import parse_datetime, INGEST_SCHEMA, DROP_COLUMNS
+
+logger = logging.getLogger("findata.store")
+
+
+class ParquetStore:
+    """
+
+    Stores each ticker as a directory of Parquet files with one file per day,
+    root/TICK/2022-04-01.parquet, holding typed price columns and a native
+    timestamp. New data is appended as new day files so history is never
+    rewritten and loads only open the files in the requested date range.
+    """
+
+    schema = INGEST_SCHEMA
+
+    def __init__(self, root):
+        self.root = root
+        makedirs(root, exist_ok=True)
+
+    def __repr__(self):
+        return f"ParquetStore at {self.root}"
+
+    def tickers(self):
+        """Returns a sorted list of the tickers in the store"""
+
+        return sorted(entry.name for entry in scandir(self.root) if entry.is_dir())
+
+    def dates(self, ticker):
+        """Returns a sorted list of the days stored for a ticker"""
+
+        ticker_path = path.join(self.root, ticker)
+        if not path.isdir(ticker_path):
+            return []
+
+        return sorted(dt.date.fromisoformat(entry.name[:-8])
+                      for entry in scandir(ticker_path)
+                      if entry.name.endswith(".parquet"))
+
+    def _day_path(self, ticker, day):
+        return path.join(self.root, ticker, f"{day.isoformat()}.parquet")
+
+    def _typed(self, frame):
+        """Returns a copy of frame with a Datetime column and the store's dtypes"""
+
+        frame = frame.copy()
+        if "Datetime" not in frame.columns:
+            frame = frame.reset_index()
+            frame.rename(columns={frame.columns[0]: "Datetime"}, inplace=True)
+        frame["Datetime"] = parse_datetime(frame["Datetime"])
+        frame = frame.drop(columns=[column for column in DROP_COLUMNS
+                                    if column in frame.columns])
+
+        for column, dtype in self.schema.items():
+            if column in frame.columns:
+                if "int" in dtype:
+                    frame[column] = frame[column].fillna(0).clip(lower=0)
+                frame[column] = frame[column].astype(dtype)
+
+        return frame
+
+    def append(self, ticker, frame):
+        """
+
+        Writes the days in frame that are not yet stored for ticker. The last
+        stored day may have been partial when written, so it is merged with any
+        new bars for that day and rewritten; all earlier days are left alone.
+        """
+
+        frame = self._typed(frame)
+        makedirs(path.join(self.root, ticker), exist_ok=True)
+        stored = self.dates(ticker)
+        last_day = stored[-1] if stored else None
+        days_written = 0
+
+        for day, day_frame in frame.groupby(frame["Datetime"].dt.date):
+            if last_day is not None and day < last_day:
+                continue
+            if day == last_day:
+                old_frame = pd.read_parquet(self._day_path(ticker, day))
+                day_frame = pd.concat([old_frame, day_frame], ignore_index=True)
+
+            day_frame = day_frame.sort_values(by="Datetime", ignore_index=True)
+            day_frame = day_frame.drop_duplicates(subset=["Datetime"], keep="first")
+            day_frame.to_parquet(self._day_path(ticker, day), index=False)
+            days_written += 1
+
+        return days_written
+
+    def read(self, ticker, columns=None, start_date=None, end_date=None):
+        """
+
+        Returns a dataframe of the bars for ticker between start_date and
+        end_date inclusive ("YYYY-MM-DD" strings or dates). When columns is
+        given only those columns, plus Datetime, are read from disk.
+        """
+
+        if isinstance(start_date, str):
+            start_date = dt.date.fromisoformat(start_date)
+        if isinstance(end_date, str):
+            end_date = dt.date.fromisoformat(end_date)
+        if columns is not None and "Datetime" not in columns:
+            columns = ["Datetime"] + list(columns)
+
+        days = [day for day in self.dates(ticker)
+                if (start_date is None or day >= start_date)
+                and (end_date is None or day <= end_date)]
+
+        if len(days) == 0:
+            return pd.DataFrame(columns=columns)
+
+        frames = [pd.read_parquet(self._day_path(ticker, day), columns=columns)
+                  for day in days]
+
+        return pd.concat(frames, ignore_index=True)
+
+    def migrate_csv(self, csv_path):
+        """
+
+        One-shot migration of every "TICK-1m.csv" file in csv_path into the
+        store. Returns the list of migrated tickers.
+        """
+
+        migrated = []
+        for file in scandir(csv_path):
+            if not file.is_file() or not file.name.endswith(".csv"):
+                continue
+
+            ticker = file.name.split("-")[0]
+            frame = pd.read_csv(file.path)
+            if "Datetime" not in frame.columns:
+                frame.rename(columns={"Unnamed: 0": "Datetime"}, inplace=True)
+
+            self.append(ticker, frame)
+            migrated.append(ticker)
+            logger.info(f"{ticker} migrated to store")
+
+        return migrated